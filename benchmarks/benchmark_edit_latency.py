@@ -0,0 +1,129 @@
+import time
+
+import numpy as np
+from data_generator import generate_data
+from mesh_generator import generate_mesh, generate_sections
+from voxel_storage import PaletteChunk
+
+from src.resource_loader import resource_loader
+from src.voxel_chunk import VoxelChunk
+
+CHUNK_SIZE = 32
+SECTION_SIZE = 8
+RUN_NUM = 500
+
+seed = 0
+offsets = ((-1, 0, 0), (0, -1, 0), (0, 0, -1), (1, 0, 0), (0, 1, 0), (0, 0, 1))
+
+original_chunks = {}
+
+for x in range(-2, 3):
+    for y in range(-2, 3):
+        for z in range(-2, 3):
+            original_chunks[(x, y, z)] = PaletteChunk.from_array(generate_data(CHUNK_SIZE, seed, x * CHUNK_SIZE, y * CHUNK_SIZE, z * CHUNK_SIZE))
+
+chunks = original_chunks
+
+# Edits break or place the highest solid voxel of random columns in the inner chunks, like a player would
+rng = np.random.default_rng(0)
+edits = []
+
+while len(edits) < RUN_NUM:
+    x, z = rng.integers(-CHUNK_SIZE, CHUNK_SIZE * 2, 2).tolist()
+
+    for y in range(CHUNK_SIZE * 2 - 1, -CHUNK_SIZE - 1, -1):
+        chunk_id = (x // CHUNK_SIZE, y // CHUNK_SIZE, z // CHUNK_SIZE)
+
+        if chunks[chunk_id].get(x % CHUNK_SIZE * CHUNK_SIZE * CHUNK_SIZE + y % CHUNK_SIZE * CHUNK_SIZE + z % CHUNK_SIZE):
+            edits.append((x, y + int(rng.integers(2)), z))
+            break
+
+
+def get_neighbors(chunk_id):
+    return tuple(chunks.get((chunk_id[0] + dx, chunk_id[1] + dy, chunk_id[2] + dz)) for dx, dy, dz in offsets)
+
+
+def create_objects():
+    # Both tests start from the generated voxel data
+    global chunks
+    chunks = {chunk_id: chunk.copy() for chunk_id, chunk in original_chunks.items()}
+    objects = {}
+
+    for chunk_id, chunk in chunks.items():
+        if max(abs(i) for i in chunk_id) < 2:
+            vertex_data, translucent_data, section_offsets = generate_sections(
+                CHUNK_SIZE, SECTION_SIZE, resource_loader.texture_types, resource_loader.occlusion_types, chunk, get_neighbors(chunk_id)
+            )
+            objects[chunk_id] = VoxelChunk(CHUNK_SIZE, resource_loader.voxel_shader)
+            objects[chunk_id].update(vertex_data, translucent_data, section_offsets)
+
+    return objects
+
+
+def apply_edit(position):
+    chunk_id = tuple(position[i] // CHUNK_SIZE for i in range(3))
+    index = position[0] % CHUNK_SIZE * CHUNK_SIZE * CHUNK_SIZE + position[1] % CHUNK_SIZE * CHUNK_SIZE + position[2] % CHUNK_SIZE
+    chunk = chunks[chunk_id]
+    chunk.set(index, 0 if chunk.get(index) else 3)
+
+    # Sections of the voxel and its six neighbors by chunk, the outer chunks are only there as neighbors
+    affected = {}
+
+    for offset in ((0, 0, 0), *offsets):
+        voxel = tuple(position[i] + offset[i] for i in range(3))
+        section = tuple(voxel[i] % CHUNK_SIZE // SECTION_SIZE for i in range(3))
+        sections = CHUNK_SIZE // SECTION_SIZE
+        affected.setdefault(tuple(voxel[i] // CHUNK_SIZE for i in range(3)), set()).add(
+            section[0] * sections * sections + section[1] * sections + section[2]
+        )
+
+    return {chunk_id: sections for chunk_id, sections in affected.items() if max(abs(i) for i in chunk_id) < 2}
+
+
+def test_full(objects):
+    # Every chunk with a changed section is meshed again completely
+    latencies = []
+
+    for position in edits:
+        start = time.perf_counter()
+
+        for chunk_id in apply_edit(position):
+            vertex_data, translucent_data = generate_mesh(
+                CHUNK_SIZE, resource_loader.texture_types, resource_loader.occlusion_types, chunks[chunk_id], get_neighbors(chunk_id)
+            )
+            objects[chunk_id].update(vertex_data, translucent_data)
+
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+def test_sections(objects):
+    latencies = []
+
+    for position in edits:
+        start = time.perf_counter()
+
+        for chunk_id, sections in apply_edit(position).items():
+            sections = np.array(sorted(sections), dtype=np.intc)
+            vertex_data, translucent_data, section_offsets = generate_sections(
+                CHUNK_SIZE,
+                SECTION_SIZE,
+                resource_loader.texture_types,
+                resource_loader.occlusion_types,
+                chunks[chunk_id],
+                get_neighbors(chunk_id),
+                sections,
+            )
+            objects[chunk_id].update_sections(sections, vertex_data, translucent_data, section_offsets)
+
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+latencies_a = test_full(create_objects())
+latencies_b = test_sections(create_objects())
+
+print(f"Edit to vertex buffer with full remesh {np.mean(latencies_a) * 1000:.3f} ms, max {np.max(latencies_a) * 1000:.3f} ms")
+print(f"Edit to vertex buffer with section remesh {np.mean(latencies_b) * 1000:.3f} ms, max {np.max(latencies_b) * 1000:.3f} ms \n")
@@ -0,0 +1,52 @@
+import time
+
+from data_generator import generate_data
+from mesh_generator import generate_mesh
+from voxel_storage import PaletteChunk
+
+from src.resource_loader import resource_loader
+
+CHUNK_SIZE = 32
+RUN_NUM = 20
+
+seed = 0
+offsets = ((-1, 0, 0), (0, -1, 0), (0, 0, -1), (1, 0, 0), (0, 1, 0), (0, 0, 1))
+
+chunks = {}
+
+for x in range(-2, 3):
+    for y in range(-2, 3):
+        for z in range(-2, 3):
+            chunks[(x, y, z)] = PaletteChunk.from_array(generate_data(CHUNK_SIZE, seed, x * CHUNK_SIZE, y * CHUNK_SIZE, z * CHUNK_SIZE))
+
+# Only chunks with all neighbors present are meshed
+jobs = []
+
+for (x, y, z), chunk in chunks.items():
+    if max(abs(x), abs(y), abs(z)) < 2:
+        jobs.append((chunk, tuple(chunks[(x + dx, y + dy, z + dz)] for dx, dy, dz in offsets)))
+
+
+def test(greedy):
+    vertex_count = 0
+
+    for _ in range(RUN_NUM):
+        vertex_count = 0
+
+        for chunk, neighbors in jobs:
+            opaque_data, translucent_data = generate_mesh(
+                CHUNK_SIZE, resource_loader.texture_types, resource_loader.occlusion_types, chunk, neighbors, greedy
+            )
+            vertex_count += len(opaque_data) + len(translucent_data)
+
+    return vertex_count
+
+
+t1 = time.perf_counter()
+vertices_a = test(False)
+t2 = time.perf_counter()
+vertices_b = test(True)
+t3 = time.perf_counter()
+
+print(f"Generate mesh per face {(t2 - t1)}, {vertices_a} vertices")
+print(f"Generate mesh greedy {(t3 - t2)}, {vertices_b} vertices \n")
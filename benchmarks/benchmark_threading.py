@@ -1,9 +1,9 @@
 import threading
 import time
 
-import numpy as np
 from data_generator import generate_data
 from mesh_generator import generate_mesh
+from voxel_storage import PaletteChunk
 
 from src.resource_loader import resource_loader
 
@@ -13,8 +13,8 @@ RUN_NUM = 36_000
 seed = 0
 position = (0, 0, 0)
 
-data = generate_data(CHUNK_SIZE, seed, *position)
-neighbors = np.zeros(6, dtype=np.longlong)
+data = PaletteChunk.from_array(generate_data(CHUNK_SIZE, seed, *position))
+neighbors = (None,) * 6
 
 threads_a = []
 for _ in range(RUN_NUM):
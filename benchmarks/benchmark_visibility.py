@@ -0,0 +1,74 @@
+import time
+
+from src.visibility import OPEN, find_visible_chunks
+
+CHUNK_SIZE = 32
+RUN_NUM = 20
+
+offsets = ((-1, 0, 0), (0, -1, 0), (0, 0, -1), (1, 0, 0), (0, 1, 0), (0, 0, 1))
+
+
+def connect(*pairs):
+    # Connectivity of a chunk whose open voxels connect the given pairs of faces, numbered like offsets
+    mask = 0
+
+    for a, b in pairs:
+        mask |= 1 << (a * 6 + b) | 1 << (b * 6 + a)
+
+    return mask
+
+
+def to_id(cell):
+    return (cell[0] * CHUNK_SIZE, cell[1] * CHUNK_SIZE, cell[2] * CHUNK_SIZE)
+
+
+def get_cells(low, high):
+    return [(x, y, z) for x in range(low[0], high[0] + 1) for y in range(low[1], high[1] + 1) for z in range(low[2], high[2] + 1)]
+
+
+def search(cells, low, high, fill=0):
+    # Searches from the chunk at (0, 0, 0) through the region between low and high, cells not in cells get fill
+    connectivity = {to_id(cell): cells.get(cell, fill) for cell in get_cells(low, high)}
+
+    def contains(chunk_id):
+        return all(low[i] * CHUNK_SIZE <= chunk_id[i] <= high[i] * CHUNK_SIZE for i in range(3))
+
+    return find_visible_chunks((0, 0, 0), CHUNK_SIZE, connectivity, contains)
+
+
+def expect(condition, case):
+    if not condition:
+        raise AssertionError(f"wrong visible chunks for {case}")
+
+
+# The chunk the search starts in and its direct neighbors are always visible
+start = {(0, 0, 0), *offsets}
+
+# Chunks behind a wall of solid chunks are hidden, the wall itself is visible
+cells = dict.fromkeys(get_cells((-1, -1, -1), (0, 1, 1)) + get_cells((2, -1, -1), (2, 1, 1)), OPEN)
+visible = search(cells, (-1, -1, -1), (2, 1, 1))
+
+expect({to_id((1, 0, 0)), to_id((1, 1, 1))} <= visible, "the wall")
+expect(not {to_id(cell) for cell in get_cells((2, -1, -1), (2, 1, 1))} & visible, "the chunks behind the wall")
+
+# A straight corridor through solid chunks is seen to its end, nothing next to it is
+corridor = {(x, 0, 0): connect((0, 3)) for x in range(1, 5)}
+visible = search({(0, 0, 0): OPEN} | corridor, (-1, -1, -1), (4, 1, 1))
+
+expect(visible == {to_id(cell) for cell in start | corridor.keys()}, "the corridor")
+
+# An L-shaped cave is followed around its corner, the solid chunk straight ahead of the corner stays hidden
+cave = {(1, 0, 0): connect((0, 3)), (2, 0, 0): connect((0, 5))} | {(2, 0, z): connect((2, 5)) for z in range(1, 4)}
+visible = search({(0, 0, 0): OPEN} | cave, (-1, -1, -1), (3, 1, 3))
+
+expect(visible == {to_id(cell) for cell in start | cave.keys()}, "the L-shaped cave")
+
+# Search through an open region with a render distance of 8
+t1 = time.perf_counter()
+
+for _ in range(RUN_NUM):
+    visible = search({}, (-8, -8, -8), (8, 8, 8), OPEN)
+
+t2 = time.perf_counter()
+
+print(f"Find visible chunks {(t2 - t1) / RUN_NUM}, {len(visible)} chunks \n")
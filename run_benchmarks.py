@@ -1,3 +1,6 @@
 # ruff: noqa F401
 import benchmarks.benchmark_no_threading
 import benchmarks.benchmark_threading
+import benchmarks.benchmark_greedy_meshing
+import benchmarks.benchmark_edit_latency
+import benchmarks.benchmark_visibility
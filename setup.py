@@ -9,6 +9,11 @@ extensions = [
         include_dirs=["lib/"],
         define_macros=[("NPY_NO_DEPRECATED_API", "NPY_1_7_API_VERSION"), ("FNL_IMPL", "")],
     ),
+    Extension(
+        name="voxel_storage",
+        sources=["src/voxel_storage.pyx"],
+        define_macros=[("NPY_NO_DEPRECATED_API", "NPY_1_7_API_VERSION")],
+    ),
     Extension(
         name="mesh_generator",
         sources=["src/mesh_generator.pyx"],
@@ -29,7 +29,7 @@ void main() {
     vec4 position = vertex + vec4(-0.5, -0.5, -0.5, 0.0);
     vec3 normal = normalize(normals[(vertex_data >> 18) & 0x7u]);
 
-    texture_id = (vertex_data >> 21) & 0xFFu;
+    texture_id = (vertex_data >> 21) & 0x7FFu;
     model_normal = normal;
     view_normal = normalize(p3d_NormalMatrix * normal);
     model_fragcoord = vertex.xyz;
@@ -0,0 +1,74 @@
+import blosc
+import numpy as np
+from voxel_storage import PaletteChunk
+
+# Every stored chunk starts with a one byte tag. Data without a known tag was written before tags existed and is a plain
+# blosc stream of the full voxel array.
+FULL_TAG = b"F"
+DELTA_TAG = b"D"  # Delta with 8 bit voxel ids
+WIDE_DELTA_TAG = b"W"  # Delta with 16 bit voxel ids
+UNIFORM_TAG = b"U"
+PALETTE_TAG = b"P"
+
+# A delta is only stored if it changes less than this fraction of the chunk
+MAX_DELTA_RATIO = 0.25
+
+
+def encode_chunk(chunk: PaletteChunk, baseline: np.ndarray = None) -> bytes:
+    if chunk.uniform_id >= 0:
+        return UNIFORM_TAG + chunk.uniform_id.to_bytes(1 if chunk.uniform_id < 256 else 2, "little")
+
+    data = chunk.to_array()
+
+    if data.min() == data.max():
+        return UNIFORM_TAG + int(data[0]).to_bytes(1 if data[0] < 256 else 2, "little")
+
+    if baseline is not None:
+        indices = np.flatnonzero(data != baseline).astype(np.uint16)
+
+        if len(indices) < len(data) * MAX_DELTA_RATIO:
+            values = data[indices]
+
+            if len(values) and values.max() > 255:
+                return WIDE_DELTA_TAG + blosc.compress(indices.tobytes() + values.tobytes(), typesize=1, cname="lz4")
+
+            return DELTA_TAG + blosc.compress(indices.tobytes() + values.astype(np.ubyte).tobytes(), typesize=1, cname="lz4")
+
+    header = np.array([chunk.palette_size], dtype="<u4").tobytes()
+    palette = chunk.palette_array[: chunk.palette_size].astype("<u2").tobytes()
+
+    return PALETTE_TAG + blosc.compress(header + palette + chunk.words_array.astype("<u8").tobytes(), typesize=1, cname="lz4")
+
+
+def is_delta(blob: bytes) -> bool:
+    return blob[:1] in (DELTA_TAG, WIDE_DELTA_TAG)
+
+
+def decode_chunk(blob: bytes, size: int, baseline: np.ndarray = None) -> PaletteChunk:
+    if blob[:1] == UNIFORM_TAG:
+        return PaletteChunk(size, [int.from_bytes(blob[1:], "little")])
+
+    if blob[:1] == PALETTE_TAG:
+        data = blosc.decompress(blob[1:])
+        palette_size = int(np.frombuffer(data, dtype="<u4", count=1)[0])
+        palette = np.frombuffer(data, dtype="<u2", count=palette_size, offset=4)
+        words = np.frombuffer(data, dtype="<u8", offset=4 + palette_size * 2)
+
+        return PaletteChunk.from_packed(size, palette_size, palette, words)
+
+    if is_delta(blob):
+        value_type = np.uint16 if blob[:1] == WIDE_DELTA_TAG else np.ubyte
+        delta = blosc.decompress(blob[1:])
+        count = len(delta) // (2 + np.dtype(value_type).itemsize)
+
+        indices = np.frombuffer(delta, dtype=np.uint16, count=count)
+        values = np.frombuffer(delta, dtype=value_type, offset=count * 2)
+
+        baseline = baseline.astype(np.uint16)
+        baseline[indices] = values
+        return PaletteChunk.from_array(baseline)
+
+    if blob[:1] == FULL_TAG:
+        blob = blob[1:]
+
+    return PaletteChunk.from_array(np.frombuffer(blosc.decompress(blob), dtype=np.ubyte))
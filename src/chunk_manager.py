@@ -1,30 +1,40 @@
 import shutil
+import threading
 import time
 import json
 import os
-from queue import Queue
 
-import blosc
 import numpy as np
-from direct.stdpy.file import *  # noqa: F403
-from data_generator import generate_data
-from mesh_generator import generate_mesh
-from ursina import Entity, Vec3, application, print_info, print_warning
 
+from direct.stdpy.file import *  # noqa: F403
+from data_generator import generate_data, get_heightmap, get_lod_heightmap, get_uniform_id
+from mesh_generator import generate_lod_mesh, generate_mesh, generate_sections, get_connectivity
+from ursina import Entity, Vec3, application, camera, print_info, print_warning
+from voxel_storage import PaletteChunk, get_voxel_ids, move_boxes, raycast
+
+from .chunk_codec import decode_chunk, encode_chunk, is_delta
+from .chunk_queue import ChunkQueue
+from .chunk_writer import ChunkWriter
+from .generation_pool import GenerationPool
+from .mesh_cache import MeshCache
+from .mesh_uploads import MeshUploads
+from .region_file import RegionStorage
+from .render_region import RenderRegion
 from .resource_loader import resource_loader
 from .settings import settings
+from .visibility import find_visible_chunks
 from .voxel_chunk import VoxelChunk
+from .worker_pool import WorkerPool
 
 CHUNK_SIZE = 32
-
-
-def tuple_to_str(data: tuple) -> str:
-    result = ""
-
-    for item in data:
-        result += f"{item}_"
-
-    return result[0:-1]
+SECTION_SIZE = 8  # Edits only remesh the sections of SECTION_SIZE**3 voxels around the modified voxel
+PREFETCH_TIME = 2.0  # Seconds the player position is extrapolated ahead for prefetching
+PREFETCH_SPEED = 1.0  # Blocks per second the player has to move before chunks in the view direction are prefetched
+MAX_LOD_LEVEL = 3  # Chunks of level n are meshed from cells of 2**n voxels
+SCATTER_THRESHOLD = CHUNK_SIZE**2  # Chunks with at least this many edits in one batch are unpacked and packed again
+VISIBILITY_INTERVAL = 0.2  # Seconds between visibility searches while only the connectivity of chunks changes
+UPLOAD_BYTES = 2**20  # Vertex data applied to chunk objects per frame
+UPLOAD_TIME = 0.003  # Seconds per frame spent applying meshes
 
 
 class ChunkManager(Entity):
@@ -34,14 +44,49 @@ class ChunkManager(Entity):
         self.updating = False
         self.world_loaded = False
         self.world_name = None
+        self.region_storage = None
+        self.chunk_writer = None
+        self.generation_pool = None  # Only used with the "processes" generation backend
+        self.mesh_cache = None
         self.finished_loading = False  # Used to disable loading screen
         self.player_to_terrain = False  # If set to true, the player position is set to (0, terrain height, 0) after loading finished.
         self.player_chunk = (0, 0, 0)  # Used to determine if the player crossed a chunk border
-        self.chunks_to_load = Queue()
-        self.chunks_to_unload = Queue()
-        self.meshes_to_update = Queue()
+        self.job_condition = threading.Condition()  # Shared by the job queues, wakes the workers
+        self.chunks_to_load = ChunkQueue(CHUNK_SIZE, condition=self.job_condition)  # Closest chunks are loaded first
+        self.chunks_to_unload = ChunkQueue(CHUNK_SIZE, reverse=True, condition=self.job_condition)
+        self.meshes_to_update = ChunkQueue(CHUNK_SIZE, repeat_active=True, condition=self.job_condition)  # Closest chunks are meshed first
+        self.worker_pool = WorkerPool(
+            self.job_condition,
+            [
+                ("load", self.chunks_to_load, self.load_data),
+                ("unload", self.chunks_to_unload, self.unload_data),
+                ("mesh", self.meshes_to_update, self.update_mesh),
+            ],
+        )
+        self.mesh_lock = threading.RLock()  # Guards loading, unloading, replacing chunks, chunk objects and mesh scheduling
+        self.waiting_meshes = set()  # Loaded chunks whose first mesh waits for neighbors that are still being loaded
+        self.neighbor_versions = {}  # Loaded chunk -> number of neighbors that were loaded since and changed its mesh
+        self.mesh_uploads = MeshUploads(CHUNK_SIZE)  # Meshes generated by the workers, applied on the main thread
+        self.meshes_generated = 0
+        self.meshes_avoided = 0  # Neighbors that arrived while a chunk was waiting, each would have caused another mesh
+        self.unsettled_chunks = set()  # Chunks that were being loaded or unloaded while the render region moved
+        self.prefetched_chunks = set()  # Chunks queued ahead of the player that are not in the render region yet
+        self.prefetch_targets = None
+        self.meshed_chunks = set()  # Loaded chunks that were meshed at least once
+        self.chunks_reached = 0
+        self.chunks_reached_unmeshed = 0  # Player chunks that were entered before their mesh was generated
         self.chunk_objects = {}
         self.loaded_chunks = {}
+        self.lod_chunks = {}  # Chunks shown with a level of detail mesh and without voxel data -> level
+        self.connectivity = {}  # Loaded chunk -> face connectivity from get_connectivity
+        self.connectivity_version = 0
+        self.stale_connectivity = set()  # Modified chunks whose connectivity is updated before the next visibility search
+        self.visibility_state = None  # Camera chunk and connectivity version of the last visibility search
+        self.visibility_time = 0
+        self.hidden_chunks = 0
+        self.dirty_chunks = set()  # Chunks modified since they were loaded, all other chunks are not written on unload
+
+        application.base.finalExitCallbacks.append(self.unload_world)
 
         self.reload()
 
@@ -49,19 +94,43 @@ class ChunkManager(Entity):
         # Loads settings stored in settings.json
 
         self.render_distance = settings.settings["render_distance"]
-        self.world_size = self.render_distance * 2 + 1
+        self.render_region = RenderRegion(CHUNK_SIZE, self.render_distance, settings.settings["render_shape"])
+        self.prefetch_budget = settings.settings["prefetch_budget"]
+
+        # Rings of the render region that are shown with full detail, half detail, ... A distance of 0 disables LOD.
+        lod_distance = settings.settings["lod_distance"]
+        self.lod_regions = []
 
-        update_threads = settings.settings["update_threads"]
-        application.base.taskMgr.remove("chunk_manager_task")
-        application.base.taskMgr.setupTaskChain("chunk_manager_chain", numThreads=update_threads)
+        for level in range(MAX_LOD_LEVEL):
+            if lod_distance and lod_distance << level < self.render_distance:
+                self.lod_regions.append(RenderRegion(CHUNK_SIZE, lod_distance << level, settings.settings["render_shape"]))
 
-        for _ in range(update_threads):
-            application.base.taskMgr.add(self.update_task, "chunk_manager_task", taskChain="chunk_manager_chain")
+        self.delta_saves = settings.settings["delta_saves"]
+        self.greedy_meshing = settings.settings["greedy_meshing"]
+        self.occlusion_culling = settings.settings["occlusion_culling"]
+        self.visibility_state = None
 
         if not self.world_loaded:
             return
 
-        for chunk in self.chunk_objects.values():
+        # The generation processes follow the backend and the thread count, no job may use the pool while it is replaced
+        workers = settings.settings["update_threads"] if settings.settings["generation_backend"] == "processes" else 0
+
+        if workers != (self.generation_pool.workers if self.generation_pool else 0):
+            self.worker_pool.close()
+
+            if self.generation_pool:
+                self.generation_pool.close()
+
+            self.generation_pool = GenerationPool(CHUNK_SIZE, self.seed, workers) if workers else None
+
+        self.worker_pool.resize(settings.settings["update_threads"])
+
+        # Workers remove chunk objects while unloading
+        with self.mesh_lock:
+            chunk_objects = list(self.chunk_objects.values())
+
+        for chunk in chunk_objects:
             chunk.set_shader_inputs(u_fog_distance=self.render_distance * CHUNK_SIZE * 2)
 
         from src.player import player
@@ -107,7 +176,7 @@ class ChunkManager(Entity):
         if os.path.exists(f"saves/{world_name}/"):
             return False
 
-        os.makedirs(f"saves/{world_name}/chunks/")
+        os.makedirs(f"saves/{world_name}/regions/")
         world_data = {"seed": seed, "player_position": [0.0, 0.0, 0.0], "player_rotation": [0.0, 0.0], "player_noclip": False}
 
         self.player_to_terrain = True
@@ -127,7 +196,7 @@ class ChunkManager(Entity):
         if self.world_loaded:
             return False
 
-        if not os.path.exists(f"saves/{world_name}/chunks"):
+        if not os.path.exists(f"saves/{world_name}/regions") and not os.path.exists(f"saves/{world_name}/chunks"):
             print_warning(f"Failed to load world '{world_name}' (missing folder)")
             return False
 
@@ -151,10 +220,24 @@ class ChunkManager(Entity):
         player.noclip_mode = self.world_data["player_noclip"]
 
         self.seed = self.world_data["seed"]
+        self.region_storage = RegionStorage(f"saves/{world_name}/regions", CHUNK_SIZE)
+
+        if os.path.exists(f"saves/{world_name}/chunks"):
+            count = self.region_storage.migrate(f"saves/{world_name}/chunks")
+            print_info(f"migrated {count} chunks of world '{world_name}' to region files")
+
+        self.chunk_writer = ChunkWriter(self.region_storage, self.compress_chunk)
+
+        if settings.settings["generation_backend"] == "processes":
+            self.generation_pool = GenerationPool(CHUNK_SIZE, self.seed, settings.settings["update_threads"])
+
+        if settings.settings["mesh_cache"]:
+            self.mesh_cache = MeshCache(f"saves/{world_name}/meshes", CHUNK_SIZE, resource_loader.texture_types, resource_loader.occlusion_types)
 
         self.finished_loading = False
         self.world_loaded = True
         self.world_name = world_name
+        self.worker_pool.resize(settings.settings["update_threads"])
 
         self.player_chunk = self.get_chunk_id(player.position)
         self.update_chunks_all()
@@ -170,13 +253,39 @@ class ChunkManager(Entity):
             return
 
         self.world_loaded = False
-        self.chunks_to_load = Queue()
-        self.chunks_to_unload = Queue()
-        self.meshes_to_update = Queue()
 
-        for chunk_id in self.loaded_chunks.copy():
+        # Running jobs finish before anything is cleared, otherwise they could still load chunks, write to the closed region
+        # files or queue meshes of this world
+        self.worker_pool.close()
+
+        self.chunks_to_load.clear()
+        self.chunks_to_unload.clear()
+        self.meshes_to_update.clear()
+        self.waiting_meshes.clear()
+        self.neighbor_versions.clear()
+        self.unsettled_chunks.clear()
+        self.stale_connectivity.clear()
+        self.visibility_state = None
+        self.prefetched_chunks.clear()
+        self.prefetch_targets = None
+
+        for chunk_id in self.loaded_chunks.keys() | self.lod_chunks.keys():
             self.unload_data(chunk_id)
 
+        self.mesh_uploads.clear()
+
+        # Waits until all queued saves are written
+        self.chunk_writer.close()
+        self.region_storage.close()
+
+        if self.generation_pool:
+            self.generation_pool.close()
+            self.generation_pool = None
+
+        if self.mesh_cache:
+            self.mesh_cache.close()
+            self.mesh_cache = None
+
         with open(f"saves/{self.world_name}/data.json", "w+") as file:
             self.world_data["player_position"] = list(player.position)
             self.world_data["player_rotation"] = [player.rotation_y, player.camera_pivot.rotation_x]
@@ -198,8 +307,9 @@ class ChunkManager(Entity):
             return None
 
         chunk_id = self.get_chunk_id(position)
+        chunk = self.loaded_chunks.get(chunk_id)
 
-        if chunk_id not in self.loaded_chunks:
+        if chunk is None:
             return None
 
         x_position = round(position[0] - chunk_id[0])
@@ -208,7 +318,34 @@ class ChunkManager(Entity):
 
         index = x_position * CHUNK_SIZE * CHUNK_SIZE + y_position * CHUNK_SIZE + z_position
 
-        return self.loaded_chunks[chunk_id][index]
+        return chunk[index]
+
+    def get_voxel_ids(self, positions: np.ndarray) -> np.ndarray:
+        # Voxel ids at an (n, 3) array of positions, -1 where the chunk is not loaded
+        if not self.world_loaded:
+            return np.full(len(positions), -1, dtype=np.intc)
+
+        return get_voxel_ids(CHUNK_SIZE, self.loaded_chunks, positions)
+
+    def raycast(self, origins: np.ndarray, directions: np.ndarray, max_distance: float) -> tuple:
+        # First voxels that are not air along rays, see raycast in voxel_storage, max_distance has to be finite
+        if not self.world_loaded:
+            count = len(np.reshape(origins, (-1, 3)))
+            return np.zeros((count, 3), dtype=np.intc), np.zeros((count, 3), dtype=np.intc), np.zeros(count, dtype=np.intc)
+
+        return raycast(CHUNK_SIZE, self.loaded_chunks, origins, directions, max_distance)
+
+    def move_boxes(self, positions: np.ndarray, velocities: np.ndarray, box_min: np.ndarray, box_max: np.ndarray, dt: float) -> tuple:
+        # Swept collision of boxes against the loaded voxels, see move_boxes in voxel_storage
+        chunks = self.loaded_chunks if self.world_loaded else {}
+
+        return move_boxes(CHUNK_SIZE, chunks, resource_loader.collision_types, positions, velocities, box_min, box_max, dt)
+
+    def get_collision(self, voxel_ids: np.ndarray) -> np.ndarray:
+        # True for voxel ids that collide, air and voxels of chunks that are not loaded never collide
+        solid = voxel_ids > 0
+
+        return solid & (resource_loader.collision_types[np.maximum(voxel_ids, 1) - 1] != 0)
 
     def modify_voxel(self, position: Vec3, voxel_id: int) -> None:
         if not self.world_loaded:
@@ -216,118 +353,529 @@ class ChunkManager(Entity):
 
         chunk_id = self.get_chunk_id(position)
 
-        if chunk_id not in self.loaded_chunks:
-            return
-
         x_position = round(position[0] - chunk_id[0])
         y_position = round(position[1] - chunk_id[1])
         z_position = round(position[2] - chunk_id[2])
 
         index = x_position * CHUNK_SIZE * CHUNK_SIZE + y_position * CHUNK_SIZE + z_position
 
-        self.loaded_chunks[chunk_id][index] = voxel_id
+        # Loaded chunks are frozen and read by the workers without locks, the edit replaces the chunk with a changed copy
+        with self.mesh_lock:
+            if chunk_id not in self.loaded_chunks:
+                return
+
+            chunk = self.loaded_chunks[chunk_id].copy()
+            chunk.set(index, voxel_id)
+            chunk.freeze()
+
+            self.loaded_chunks[chunk_id] = chunk
+            self.dirty_chunks.add(chunk_id)
+
+        self.stale_connectivity.add(chunk_id)
+        self.connectivity_version += 1
+
+        if self.mesh_cache:
+            self.mesh_cache.invalidate(chunk_id)
+
+        # The faces of the voxel and of its six neighbors can change, their sections may lie in neighboring chunks
+        sections = {}
+
+        for offset in [(0, 0, 0), (-1, 0, 0), (0, -1, 0), (0, 0, -1), (1, 0, 0), (0, 1, 0), (0, 0, 1)]:
+            voxel_position = (x_position + chunk_id[0] + offset[0], y_position + chunk_id[1] + offset[1], z_position + chunk_id[2] + offset[2])
+            section_chunk_id, section = self.get_section(voxel_position)
+            sections.setdefault(section_chunk_id, set()).add(section)
+
+        for section_chunk_id, chunk_sections in sections.items():
+            self.update_sections(section_chunk_id, chunk_sections)
+
+    def modify_voxels(self, positions: np.ndarray, voxel_ids, replace: int = None) -> None:
+        # Sets the voxels at an (n, 3) array of positions to one voxel id or an array of n ids. With replace set only
+        # voxels of that id are changed. Every changed chunk and every neighbor sharing a changed border is meshed once.
+        if not self.world_loaded:
+            return
+
+        positions = np.floor(np.asarray(positions, dtype=np.float64).reshape(-1, 3) + 0.5).astype(np.int64)
+
+        if not len(positions):
+            return
+
+        voxel_ids = np.broadcast_to(np.asarray(voxel_ids, dtype=np.uint16), len(positions))
+
+        chunk_positions = positions // CHUNK_SIZE * CHUNK_SIZE
+        local_positions = positions - chunk_positions
+        indices = local_positions[:, 0] * CHUNK_SIZE * CHUNK_SIZE + local_positions[:, 1] * CHUNK_SIZE + local_positions[:, 2]
+
+        # Positions are grouped by chunk with a single sort of one key per position
+        coordinates = chunk_positions // CHUNK_SIZE
+        keys = coordinates[:, 0] << 42 | (coordinates[:, 1] & 0x1FFFFF) << 21 | coordinates[:, 2] & 0x1FFFFF
+        order = np.argsort(keys, kind="stable")
+        affected = set()
 
-        self.update_mesh(chunk_id)
+        for group in np.split(order, np.flatnonzero(np.diff(keys[order])) + 1):
+            chunk_id = tuple(chunk_positions[group[0]].tolist())
 
-        # Check if neighboring chunks need to be updated
-        if x_position == 0:
-            self.update_mesh((chunk_id[0] - CHUNK_SIZE, chunk_id[1], chunk_id[2]))
+            with self.mesh_lock:
+                if chunk_id not in self.loaded_chunks:
+                    continue
 
-        if x_position == CHUNK_SIZE - 1:
-            self.update_mesh((chunk_id[0] + CHUNK_SIZE, chunk_id[1], chunk_id[2]))
+                chunk = self.loaded_chunks[chunk_id]
+                chunk_indices = indices[group]
+                chunk_voxel_ids = voxel_ids[group]
 
-        if y_position == 0:
-            self.update_mesh((chunk_id[0], chunk_id[1] - CHUNK_SIZE, chunk_id[2]))
+                # Large batches are scattered into the unpacked array and packed again, smaller ones are set in a copy
+                scatter = len(group) >= SCATTER_THRESHOLD
 
-        if y_position == CHUNK_SIZE - 1:
-            self.update_mesh((chunk_id[0], chunk_id[1] + CHUNK_SIZE, chunk_id[2]))
+                if scatter:
+                    data = chunk.to_array()
+                    current = data[chunk_indices]
+                else:
+                    current = np.array([chunk.get(index) for index in chunk_indices.tolist()], dtype=np.uint16)
 
-        if z_position == 0:
-            self.update_mesh((chunk_id[0], chunk_id[1], chunk_id[2] - CHUNK_SIZE))
+                changed = current != chunk_voxel_ids
 
-        if z_position == CHUNK_SIZE - 1:
-            self.update_mesh((chunk_id[0], chunk_id[1], chunk_id[2] + CHUNK_SIZE))
+                if replace is not None:
+                    changed &= current == replace
+
+                if not changed.any():
+                    continue
+
+                chunk_indices = chunk_indices[changed]
+                chunk_voxel_ids = chunk_voxel_ids[changed]
+
+                if scatter:
+                    data[chunk_indices] = chunk_voxel_ids
+                    chunk = PaletteChunk.from_array(data)
+                else:
+                    chunk = chunk.copy()
+
+                    for index, voxel_id in zip(chunk_indices.tolist(), chunk_voxel_ids.tolist(), strict=True):
+                        chunk.set(index, voxel_id)
+
+                chunk.freeze()
+                self.loaded_chunks[chunk_id] = chunk
+                self.dirty_chunks.add(chunk_id)
+
+            self.stale_connectivity.add(chunk_id)
+            self.connectivity_version += 1
+
+            if self.mesh_cache:
+                self.mesh_cache.invalidate(chunk_id)
+
+            # Neighbors only change if a voxel on the shared border changed
+            affected.add(chunk_id)
+            local_positions = np.unravel_index(chunk_indices, (CHUNK_SIZE,) * 3)
+
+            for face, neighbor_id in enumerate(self.get_neighbor_ids(chunk_id)):
+                if (local_positions[face % 3] == (0 if face < 3 else CHUNK_SIZE - 1)).any():
+                    affected.add(neighbor_id)
+
+        with self.mesh_lock:
+            for chunk_id in affected & self.loaded_chunks.keys():
+                self.schedule_mesh(chunk_id)
+
+    def fill_box(self, start: tuple, end: tuple, voxel_id: int, replace: int = None) -> None:
+        # Fills the box between two corners, both inclusive
+        start, end = np.minimum(start, end), np.maximum(start, end)
+        grid = np.mgrid[start[0] : end[0] + 1, start[1] : end[1] + 1, start[2] : end[2] + 1]
+
+        self.modify_voxels(grid.reshape(3, -1).T, voxel_id, replace)
+
+    def fill_sphere(self, center: tuple, radius: float, voxel_id: int, replace: int = None) -> None:
+        center = np.floor(np.asarray(center, dtype=np.float64) + 0.5).astype(np.int64)
+        extent = int(np.ceil(radius))
+        offsets = np.mgrid[-extent : extent + 1, -extent : extent + 1, -extent : extent + 1].reshape(3, -1).T
+        offsets = offsets[(offsets**2).sum(axis=1) <= radius**2]
+
+        self.modify_voxels(center + offsets, voxel_id, replace)
+
+    def replace_voxels(self, start: tuple, end: tuple, old_id: int, new_id: int) -> None:
+        # Replaces all voxels of one id in the box between two corners
+        self.fill_box(start, end, new_id, replace=old_id)
+
+    def get_section(self, position: tuple) -> tuple:
+        # Chunk id and section index of a voxel position, sections are numbered like voxels within a chunk
+        chunk_id = self.get_chunk_id(position)
+        sections = CHUNK_SIZE // SECTION_SIZE
+        x, y, z = ((position[i] - chunk_id[i]) // SECTION_SIZE for i in range(3))
+
+        return chunk_id, x * sections * sections + y * sections + z
 
     def get_terrain_height(self, position: Vec3) -> Vec3:
+        # Top of the colliding voxels in the column at position, searched up to 50 voxels up or down
         current_position = round(position, ndigits=0)
-        voxel_id = self.get_voxel_id(current_position)
-        step_y = 1 if voxel_id and resource_loader.collision_types[voxel_id - 1] else -1
+        steps = np.arange(-49, 50)
+        column = np.zeros((len(steps), 3))
+        column[:] = tuple(current_position)
+        column[:, 1] += steps
+
+        solid = self.get_collision(self.get_voxel_ids(column))
 
-        for _ in range(50):
-            voxel_id = self.get_voxel_id(current_position)
+        if solid[49]:
+            free = np.flatnonzero(~solid[49:])
+            return current_position + Vec3(0, free[0] - 1, 0) if len(free) else None
 
-            if voxel_id and resource_loader.collision_types[voxel_id - 1]:
-                if step_y < 0:
-                    return current_position
+        below = np.flatnonzero(solid[49::-1])
+        return current_position - Vec3(0, below[0], 0) if len(below) else None
 
-            elif step_y > 0:
-                return current_position - Vec3.up
+    def get_level(self, chunk_id: tuple) -> int:
+        # Level of detail the chunk should be shown with, 0 is full detail
+        for level, region in enumerate(self.lod_regions):
+            if region.contains(self.player_chunk, chunk_id):
+                return level
 
-            current_position.y += step_y
+        return len(self.lod_regions)
 
-        return None
+    def get_current_level(self, chunk_id: tuple) -> int:
+        # Level of detail the chunk is shown with, None if it is not loaded
+        if chunk_id in self.loaded_chunks:
+            return 0
+
+        return self.lod_chunks.get(chunk_id)
 
     def load_data(self, chunk_id: tuple) -> None:
+        level = self.get_level(chunk_id)
+
+        if level:
+            self.load_lod(chunk_id, level)
+            return
+
         if chunk_id in self.loaded_chunks:
             return
 
-        filename = f"./saves/{self.world_name}/chunks/{tuple_to_str(chunk_id)}"
+        # A level of detail mesh stays visible until the chunk is meshed again with full detail
+        self.lod_chunks.pop(chunk_id, None)
+
+        pending = self.chunk_writer.get(chunk_id)
+        blob = self.region_storage.read(chunk_id) if pending is None else None
+
+        if pending is not None:
+            chunk = pending
 
-        if os.path.exists(filename):
-            with open(filename, "rb") as file:
-                data = blosc.decompress(file.read(), as_bytearray=True)
-                self.loaded_chunks[chunk_id] = np.frombuffer(data, dtype=np.ubyte)
+        elif blob is not None:
+            baseline = self.generate_chunk(chunk_id).to_array() if is_delta(blob) else None
+            chunk = decode_chunk(blob, CHUNK_SIZE**3, baseline)
 
         else:
-            self.loaded_chunks[chunk_id] = generate_data(CHUNK_SIZE, self.seed, *chunk_id)
+            chunk = self.generate_chunk(chunk_id)
 
-        for offset in [(-1, 0, 0), (0, -1, 0), (0, 0, -1), (1, 0, 0), (0, 1, 0), (0, 0, 1)]:
-            neighbor_id = (
-                offset[0] * CHUNK_SIZE + chunk_id[0],
-                offset[1] * CHUNK_SIZE + chunk_id[1],
-                offset[2] * CHUNK_SIZE + chunk_id[2],
-            )
+        chunk.freeze()
 
-            if neighbor_id in self.chunk_objects:
-                self.meshes_to_update.put(neighbor_id)
+        with self.mesh_lock:
+            self.loaded_chunks[chunk_id] = chunk
+            self.update_connectivity(chunk_id)
 
-        self.meshes_to_update.put(chunk_id)
+            self.waiting_meshes.add(chunk_id)
+            self.schedule_mesh(chunk_id)
+
+            # Faces on the border to a missing chunk are not meshed. A chunk filled with an occluding voxel hides them
+            # the same way and a chunk of air has no faces, so neither has to be meshed again for the new neighbor.
+            voxel_id = chunk.uniform_id
+            occluding = voxel_id > 0 and resource_loader.occlusion_types[voxel_id - 1]
+
+            for neighbor_id in self.get_neighbor_ids(chunk_id):
+                if neighbor_id not in self.loaded_chunks:
+                    continue
+
+                affected = neighbor_id in self.waiting_meshes or not occluding and self.loaded_chunks[neighbor_id].uniform_id != 0
+
+                # Meshes of the neighbor generated without this chunk are outdated
+                if affected:
+                    self.neighbor_versions[neighbor_id] = self.neighbor_versions.get(neighbor_id, 0) + 1
+
+                if not affected or not self.schedule_mesh(neighbor_id):
+                    self.meshes_avoided += 1
+
+    def load_lod(self, chunk_id: tuple, level: int) -> None:
+        # Far chunks are meshed from a heightmap with one sample per cell. Saved modifications are not shown but kept, the
+        # chunk is loaded from the region file again once it is shown with full detail.
+        if self.lod_chunks.get(chunk_id) == level:
+            return
+
+        self.release_data(chunk_id)
+
+        heights = get_lod_heightmap(CHUNK_SIZE, self.seed, chunk_id[0], chunk_id[2], 1 << level)
+        vertex_data, translucent_data = generate_lod_mesh(CHUNK_SIZE, resource_loader.texture_types, heights, chunk_id[1], 1 << level)
+
+        with self.mesh_lock:
+            self.lod_chunks[chunk_id] = level
+
+        self.mesh_uploads.put(chunk_id, (level, None, None, None, vertex_data, translucent_data, None), vertex_data.nbytes + translucent_data.nbytes)
 
     def unload_data(self, chunk_id: tuple) -> None:
-        if chunk_id not in self.loaded_chunks:
+        # The object is removed together with the voxel data, so a mesh that is still being uploaded finds neither. Its
+        # node is removed on the main thread.
+        with self.mesh_lock:
+            if chunk_id in self.chunk_objects:
+                self.mesh_uploads.retire(self.chunk_objects.pop(chunk_id))
+
+            self.lod_chunks.pop(chunk_id, None)
+            self.release_data(chunk_id)
+
+    def release_data(self, chunk_id: tuple) -> None:
+        with self.mesh_lock:
+            if chunk_id not in self.loaded_chunks:
+                return
+
+            # Unmodified chunks are either already saved or can be generated again from the seed
+            if chunk_id in self.dirty_chunks:
+                self.dirty_chunks.discard(chunk_id)
+                self.chunk_writer.put(chunk_id, self.loaded_chunks[chunk_id])
+
+            self.loaded_chunks.pop(chunk_id)
+            self.meshed_chunks.discard(chunk_id)
+            self.waiting_meshes.discard(chunk_id)
+            self.neighbor_versions.pop(chunk_id, None)
+            self.connectivity.pop(chunk_id, None)
+            self.connectivity_version += 1
+
+            # Neighbors may have been waiting for this chunk
+            for neighbor_id in self.get_neighbor_ids(chunk_id):
+                if neighbor_id in self.waiting_meshes:
+                    self.schedule_mesh(neighbor_id)
+
+        if self.mesh_cache:
+            self.mesh_cache.invalidate(chunk_id)
+
+    def generate_chunk(self, chunk_id: tuple) -> PaletteChunk:
+        # Chunks filled with a single voxel id are detected from the heightmap and never get a full array
+        voxel_id = get_uniform_id(CHUNK_SIZE, self.seed, *chunk_id)
+
+        if voxel_id >= 0:
+            return PaletteChunk(CHUNK_SIZE**3, [voxel_id])
+
+        if not self.generation_pool:
+            return PaletteChunk.from_array(generate_data(CHUNK_SIZE, self.seed, *chunk_id))
+
+        # The worker process gets the heightmap of the uniform check instead of computing it again. The chunk is packed
+        # straight out of the shared memory slot, which can be reused right after.
+        data = self.generation_pool.generate(chunk_id, get_heightmap(CHUNK_SIZE, self.seed, chunk_id[0], chunk_id[2]))
+        chunk = PaletteChunk.from_array(data)
+        self.generation_pool.release(data)
+
+        return chunk
+
+    def compress_chunk(self, chunk_id: tuple, chunk: PaletteChunk) -> bytes:
+        # Runs on the chunk writer thread
+        baseline = generate_data(CHUNK_SIZE, self.seed, *chunk_id) if self.delta_saves else None
+
+        return encode_chunk(chunk, baseline)
+
+    def update_connectivity(self, chunk_id: tuple) -> None:
+        self.connectivity[chunk_id] = get_connectivity(CHUNK_SIZE, resource_loader.occlusion_types, self.loaded_chunks[chunk_id])
+        self.connectivity_version += 1
+
+    def update_visibility(self) -> None:
+        # Hides chunks that can not be seen from the camera chunk through voxels that do not occlude
+        if not self.occlusion_culling:
+            if self.hidden_chunks:
+                for chunk in list(self.chunk_objects.values()):
+                    chunk.show()
+
+                self.hidden_chunks = 0
+
             return
 
-        if chunk_id in self.chunk_objects:
-            chunk = self.chunk_objects.pop(chunk_id)
-            chunk.remove_node()
+        camera_chunk = self.get_chunk_id(camera.world_position)
+        state = (camera_chunk, self.connectivity_version)
+
+        if state == self.visibility_state:
+            return
+
+        # While chunks are loading the connectivity changes every frame, the search is only repeated every few frames then
+        if self.visibility_state and camera_chunk == self.visibility_state[0] and time.perf_counter() - self.visibility_time < VISIBILITY_INTERVAL:
+            return
+
+        self.visibility_state = state
+        self.visibility_time = time.perf_counter()
+
+        for chunk_id in self.stale_connectivity:
+            if (chunk := self.loaded_chunks.get(chunk_id)) is None:
+                continue
+
+            connectivity = get_connectivity(CHUNK_SIZE, resource_loader.occlusion_types, chunk)
+
+            # A worker may have unloaded or replaced the chunk while its connectivity was computed
+            with self.mesh_lock:
+                if self.loaded_chunks.get(chunk_id) is chunk:
+                    self.connectivity[chunk_id] = connectivity
 
-        filename = f"./saves/{self.world_name}/chunks/{tuple_to_str(chunk_id)}"
+        self.stale_connectivity.clear()
 
-        with open(filename, "wb") as file:
-            data = self.loaded_chunks.pop(chunk_id)
-            file.write(blosc.compress(data, typesize=data.itemsize, cname="lz4"))
+        def contains(chunk_id: tuple) -> bool:
+            return self.render_region.contains(self.player_chunk, chunk_id)
+
+        visible = find_visible_chunks(camera_chunk, CHUNK_SIZE, self.connectivity, contains)
+        self.hidden_chunks = 0
+
+        for chunk_id, chunk in list(self.chunk_objects.items()):
+            if chunk_id in visible:
+                if chunk.is_hidden():
+                    chunk.show()
+
+            else:
+                self.hidden_chunks += 1
+
+                if not chunk.is_hidden():
+                    chunk.hide()
+
+    def get_neighbor_ids(self, chunk_id: tuple) -> list:
+        # Neighboring chunk ids in the order -x, -y, -z, +x, +y, +z used by generate_mesh
+        return [
+            (offset[0] * CHUNK_SIZE + chunk_id[0], offset[1] * CHUNK_SIZE + chunk_id[1], offset[2] * CHUNK_SIZE + chunk_id[2])
+            for offset in [(-1, 0, 0), (0, -1, 0), (0, 0, -1), (1, 0, 0), (0, 1, 0), (0, 0, 1)]
+        ]
+
+    def is_expected(self, chunk_id: tuple) -> bool:
+        # True if the chunk is not loaded yet but will be loaded with voxel data. Chunks outside of the render region and
+        # level of detail chunks are known to stay absent.
+        if chunk_id in self.loaded_chunks:
+            return False
+
+        return self.render_region.contains(self.player_chunk, chunk_id) and not self.get_level(chunk_id)
+
+    def schedule_mesh(self, chunk_id: tuple, force: bool = False) -> bool:
+        # The first mesh of a chunk waits until no neighbor is expected anymore, otherwise it would be meshed again for
+        # every neighbor that arrives while loading. Returns false if the chunk keeps waiting. Has to be called with
+        # mesh_lock held.
+        if chunk_id in self.waiting_meshes:
+            if not force and any(self.is_expected(neighbor_id) for neighbor_id in self.get_neighbor_ids(chunk_id)):
+                return False
+
+            self.waiting_meshes.discard(chunk_id)
+
+        self.meshes_to_update.put(chunk_id)
+
+        return True
+
+    def schedule_waiting(self, force: bool = False) -> None:
+        with self.mesh_lock:
+            for chunk_id in list(self.waiting_meshes):
+                self.schedule_mesh(chunk_id, force)
 
     def update_mesh(self, chunk_id: tuple) -> None:
-        if chunk_id not in self.loaded_chunks:
+        # The chunk and its neighbors are taken once, the references keep them alive even if they are unloaded meanwhile.
+        # The neighbor version is taken first, so a neighbor loaded while they are taken always changes it.
+        chunk = self.loaded_chunks.get(chunk_id)
+        version = self.neighbor_versions.get(chunk_id, 0)
+
+        if chunk is None:
             return
 
-        neighbors = np.zeros(6, dtype=np.longlong)
+        neighbor_ids = self.get_neighbor_ids(chunk_id)
+        neighbors = [self.loaded_chunks.get(neighbor_id) for neighbor_id in neighbor_ids]
+        cached = None
+
+        # Only meshes with all neighbors loaded are cached, the others are replaced as soon as the neighbors arrive
+        if self.mesh_cache and None not in neighbors:
+            key = self.mesh_cache.get_key([chunk_id, *neighbor_ids], [chunk, *neighbors], self.greedy_meshing)
+            cached = self.mesh_cache.get(chunk_id, key)
+
+        # Section offsets are only known for meshes generated per face, edits of other meshes remesh the whole chunk once
+        offsets = None
+
+        if cached is not None:
+            vertex_data, translucent_data = cached
+
+        else:
+            if self.greedy_meshing:
+                vertex_data, translucent_data = generate_mesh(
+                    CHUNK_SIZE, resource_loader.texture_types, resource_loader.occlusion_types, chunk, tuple(neighbors), True
+                )
+
+            else:
+                vertex_data, translucent_data, offsets = generate_sections(
+                    CHUNK_SIZE, SECTION_SIZE, resource_loader.texture_types, resource_loader.occlusion_types, chunk, tuple(neighbors)
+                )
+
+            if self.mesh_cache and None not in neighbors:
+                self.mesh_cache.put(chunk_id, key, vertex_data, translucent_data)
+
+        self.meshes_generated += 1
+        mesh = (0, chunk, neighbors, version, vertex_data, translucent_data, offsets)
+        self.mesh_uploads.put(chunk_id, mesh, vertex_data.nbytes + translucent_data.nbytes)
+
+    def apply_mesh(self, chunk_id: tuple, mesh: tuple) -> None:
+        # Runs on the main thread, meshes generated from chunks that were replaced or unloaded since are dropped
+        level, chunk, neighbors, version, vertex_data, translucent_data, offsets = mesh
+
+        with self.mesh_lock:
+            # LOD meshes of an unloaded world can not arrive here, the workers are stopped before the uploads are cleared
+            if level:
+                current = self.lod_chunks.get(chunk_id) == level
+            else:
+                current = self.is_current(chunk_id, chunk, self.get_neighbor_ids(chunk_id), neighbors, version)
+
+            if not current:
+                return
+
+            if not level:
+                self.meshed_chunks.add(chunk_id)
+
+            self.set_mesh(chunk_id, vertex_data, translucent_data, offsets)
+
+    def is_current(self, chunk_id: tuple, chunk: PaletteChunk, neighbor_ids: list, neighbors: list, version: int) -> bool:
+        # A mesh is outdated if its chunk or a neighbor it was generated from was replaced by another chunk, or if a neighbor
+        # that changes it was loaded since, see load_data. Unloaded neighbors only hide faces and keep the mesh. A chunk
+        # that is still loaded is meshed again with its current data. Has to be called with mesh_lock held.
+        current = self.loaded_chunks.get(chunk_id)
+        replaced = False
+
+        for neighbor_id, neighbor in zip(neighbor_ids, neighbors, strict=True):
+            loaded = self.loaded_chunks.get(neighbor_id)
+            replaced |= neighbor is not None and loaded is not None and loaded is not neighbor
+
+        if current is chunk and not replaced and self.neighbor_versions.get(chunk_id, 0) == version:
+            return True
+
+        if current is not None:
+            self.meshes_to_update.put(chunk_id)
+
+        return False
 
-        for i, offset in enumerate([(-1, 0, 0), (0, -1, 0), (0, 0, -1), (1, 0, 0), (0, 1, 0), (0, 0, 1)]):
-            neighbor_id = (
-                offset[0] * CHUNK_SIZE + chunk_id[0],
-                offset[1] * CHUNK_SIZE + chunk_id[1],
-                offset[2] * CHUNK_SIZE + chunk_id[2],
-            )
+    def update_sections(self, chunk_id: tuple, sections: set) -> None:
+        # Remeshes the given sections of a chunk and splices them into its vertex data
+        palette_chunk = self.loaded_chunks.get(chunk_id)
+        chunk = self.chunk_objects.get(chunk_id)
 
-            if neighbor_id in self.loaded_chunks:
-                neighbors[i] = self.loaded_chunks[neighbor_id].ctypes.data
+        if palette_chunk is None:
+            return
+
+        if chunk is None or chunk.offsets is None:
+            self.update_mesh(chunk_id)
+            return
 
-        vertex_data = generate_mesh(
-            CHUNK_SIZE, resource_loader.texture_types, resource_loader.occlusion_types, self.loaded_chunks[chunk_id], neighbors
+        sections = np.array(sorted(sections), dtype=np.intc)
+        version = self.neighbor_versions.get(chunk_id, 0)
+        neighbor_ids = self.get_neighbor_ids(chunk_id)
+        neighbors = [self.loaded_chunks.get(neighbor_id) for neighbor_id in neighbor_ids]
+
+        vertex_data, translucent_data, offsets = generate_sections(
+            CHUNK_SIZE,
+            SECTION_SIZE,
+            resource_loader.texture_types,
+            resource_loader.occlusion_types,
+            palette_chunk,
+            tuple(neighbors),
+            sections,
         )
 
-        if len(vertex_data) == 0:
+        with self.mesh_lock:
+            if not self.is_current(chunk_id, palette_chunk, neighbor_ids, neighbors, version):
+                return
+
+            # The object was replaced by a mesh job in the meantime
+            if self.chunk_objects.get(chunk_id) is not chunk:
+                self.meshes_to_update.put(chunk_id)
+                return
+
+            chunk.update_sections(sections, vertex_data, translucent_data, offsets)
+
+            if not chunk.offsets[:, -1].any():
+                self.chunk_objects.pop(chunk_id)
+                chunk.remove_node()
+
+    def set_mesh(self, chunk_id: tuple, vertex_data: np.ndarray, translucent_data: np.ndarray, offsets: np.ndarray = None) -> None:
+        if len(vertex_data) == 0 and len(translucent_data) == 0:
             if chunk_id in self.chunk_objects:
                 chunk = self.chunk_objects.pop(chunk_id)
                 chunk.remove_node()
@@ -343,49 +891,118 @@ class ChunkManager(Entity):
 
         chunk = self.chunk_objects[chunk_id]
 
-        chunk.update(vertex_data)
+        chunk.update(vertex_data, translucent_data, offsets)
 
     def update_chunks_all(self) -> None:
-        chunk_ids = set()
-
-        for i in range(self.world_size**3):
-            x = i // (self.world_size * self.world_size) - self.render_distance
-            y = i // self.world_size % self.world_size - self.render_distance
-            z = i % self.world_size - self.render_distance
-
-            chunk_ids.add(
-                (
-                    int(x * CHUNK_SIZE + self.player_chunk[0]),
-                    int(y * CHUNK_SIZE + self.player_chunk[1]),
-                    int(z * CHUNK_SIZE + self.player_chunk[2]),
-                )
-            )
+        chunk_ids = self.render_region.get_chunks(self.player_chunk)
+        self.retain_requests()
 
-        for chunk_id in chunk_ids - self.loaded_chunks.keys():
-            self.chunks_to_load.put(chunk_id)
+        for chunk_id in chunk_ids:
+            if self.get_current_level(chunk_id) != self.get_level(chunk_id):
+                self.chunks_to_load.put(chunk_id)
 
-        for chunk_id in self.loaded_chunks.keys() - chunk_ids:
+        for chunk_id in (self.loaded_chunks.keys() | self.lod_chunks.keys()) - chunk_ids:
             self.chunks_to_unload.put(chunk_id)
 
-    def update_task(self, task) -> None:
-        if not self.chunks_to_load.empty():
-            chunk_id = self.chunks_to_load.get()
-            self.load_data(chunk_id)
-            self.chunks_to_load.task_done()
+    def update_chunks_moved(self, old_player_chunk: tuple) -> None:
+        # Only the slabs of chunks entering and leaving the render region and its level of detail rings are visited
+        entering, leaving = self.render_region.diff(old_player_chunk, self.player_chunk)
+        self.retain_requests()
 
-        elif not self.chunks_to_unload.empty():
-            chunk_id = self.chunks_to_unload.get()
-            self.unload_data(chunk_id)
-            self.chunks_to_unload.task_done()
+        for region in self.lod_regions:
+            for chunk_ids in region.diff(old_player_chunk, self.player_chunk):
+                entering |= chunk_ids - leaving
 
-        elif not self.meshes_to_update.empty():
-            chunk_id = self.meshes_to_update.get()
-            self.update_mesh(chunk_id)
-            self.meshes_to_update.task_done()
+        for chunk_id in entering:
+            if self.get_current_level(chunk_id) != self.get_level(chunk_id):
+                self.chunks_to_load.put(chunk_id)
 
-        time.sleep(0.0005)
+        for chunk_id in leaving:
+            if self.get_current_level(chunk_id) is not None:
+                self.chunks_to_unload.put(chunk_id)
 
-        return task.cont
+        # Neighbors that left the region or turned into level of detail chunks are not waited for anymore
+        self.schedule_waiting()
+
+    def retain_requests(self) -> None:
+        # Requests that left the render region are dropped, the rest is ordered by the distance to the new player chunk
+        self.unsettled_chunks |= self.chunks_to_load.get_active() | self.chunks_to_unload.get_active()
+
+        # Prefetched chunks either entered the region or are unloaded again if the prediction was wrong
+        for chunk_id in self.prefetched_chunks:
+            if self.get_current_level(chunk_id) is not None and not self.render_region.contains(self.player_chunk, chunk_id):
+                self.chunks_to_unload.put(chunk_id)
+
+        self.prefetched_chunks.clear()
+        self.prefetch_targets = None
+
+        def contains(chunk_id: tuple) -> bool:
+            return self.render_region.contains(self.player_chunk, chunk_id)
+
+        self.chunks_to_load.retain(self.player_chunk, contains)
+        self.chunks_to_unload.retain(self.player_chunk, lambda chunk_id: not contains(chunk_id))
+        self.meshes_to_update.retain(self.player_chunk, lambda chunk_id: True)
+        self.mesh_uploads.retain(self.player_chunk)
+
+    def settle_chunks(self) -> None:
+        for chunk_id in self.unsettled_chunks:
+            level = self.get_current_level(chunk_id)
+
+            if not self.render_region.contains(self.player_chunk, chunk_id):
+                if level is not None:
+                    self.chunks_to_unload.put(chunk_id)
+
+            elif level != self.get_level(chunk_id):
+                self.chunks_to_load.put(chunk_id)
+
+        self.unsettled_chunks.clear()
+
+    def prefetch(self) -> None:
+        # Queues chunks that are about to enter the render region, predicted from the player velocity and the view direction.
+        # The view direction only counts while the player moves, a player looking around on the spot keeps the region.
+        from src.player import player
+
+        if not self.prefetch_budget:
+            return
+
+        targets = {self.get_chunk_id(player.position + player.velocity * PREFETCH_TIME)}
+
+        if player.velocity.length() >= PREFETCH_SPEED:
+            targets.add(self.get_chunk_id(player.camera_pivot.world_position + player.camera_pivot.forward * CHUNK_SIZE))
+
+        targets.discard(self.player_chunk)
+
+        if targets == self.prefetch_targets:
+            return
+
+        self.prefetch_targets = targets
+        candidates = set()
+
+        for target in targets:
+            candidates |= self.render_region.diff(self.player_chunk, target)[0]
+
+        # Chunks prefetched for an earlier prediction are unloaded again, prefetch only runs once they are loaded
+        for chunk_id in self.prefetched_chunks - candidates:
+            if self.get_current_level(chunk_id) is not None and not self.render_region.contains(self.player_chunk, chunk_id):
+                self.chunks_to_unload.put(chunk_id)
+
+        self.prefetched_chunks &= candidates
+        candidates -= self.loaded_chunks.keys() | self.lod_chunks.keys() | self.prefetched_chunks
+
+        def get_distance(chunk_id: tuple) -> float:
+            return sum((chunk_id[i] + CHUNK_SIZE / 2 - player.position[i]) ** 2 for i in range(3))
+
+        for chunk_id in sorted(candidates, key=get_distance)[: max(self.prefetch_budget - len(self.prefetched_chunks), 0)]:
+            self.prefetched_chunks.add(chunk_id)
+            self.chunks_to_load.put(chunk_id)
+
+    def is_updating(self) -> bool:
+        return bool(
+            self.chunks_to_load.unfinished_tasks
+            or self.chunks_to_unload.unfinished_tasks
+            or self.meshes_to_update.unfinished_tasks
+            or self.mesh_uploads.backlog
+        )
 
     def update(self) -> None:
         from src.player import player
@@ -393,21 +1010,42 @@ class ChunkManager(Entity):
         if not self.world_loaded:
             return
 
+        self.mesh_uploads.apply(self.apply_mesh, UPLOAD_BYTES, UPLOAD_TIME)
+        self.update_visibility()
         self.updating = True
 
         new_player_chunk = self.get_chunk_id(player.position)
 
-        if not self.chunks_to_load.empty() or not self.chunks_to_unload.empty() or not self.meshes_to_update.empty():
-            return
-
         if self.player_chunk != new_player_chunk:
+            old_player_chunk = self.player_chunk
             self.player_chunk = new_player_chunk
-            self.update_chunks_all()
+            self.update_chunks_moved(old_player_chunk)
+
+            self.chunks_reached += 1
+
+            if new_player_chunk not in self.meshed_chunks:
+                self.chunks_reached_unmeshed += 1
+
+            return
+
+        if self.is_updating():
+            return
+
+        # Chunks that were loaded or unloaded while the region moved are checked again once everything settled
+        if self.unsettled_chunks:
+            self.settle_chunks()
+
+        # Nothing is loading anymore, chunks still waiting for a neighbor are meshed with the neighbors that are there
+        elif self.waiting_meshes:
+            self.schedule_waiting(force=True)
 
         else:
             self.updating = False
             self.finished_loading = True
 
+            # Loaders are idle and can fetch chunks ahead of the player without delaying chunks in the render region
+            self.prefetch()
+
             if self.player_to_terrain:
                 if terrain_height := self.get_terrain_height(Vec3(0)):
                     player.position = terrain_height + Vec3(0, 2, 0)
@@ -0,0 +1,101 @@
+import heapq
+import threading
+
+
+class ChunkQueue:
+    # Priority queue of chunk ids ordered by their distance to a center chunk, closest first or farthest first with
+    # reverse set. Every chunk id is queued at most once and ids that are being worked on are not queued again, unless
+    # repeat_active is set, then they are queued again once they are done. Queues given a condition use it as their lock
+    # and notify it whenever an id is queued.
+
+    def __init__(self, chunk_size: int, reverse: bool = False, repeat_active: bool = False, condition: threading.Condition = None) -> None:
+        self.chunk_size = chunk_size
+        self.reverse = reverse
+        self.repeat_active = repeat_active
+        self.center = (0, 0, 0)
+
+        self.condition = condition
+        self.lock = threading.Lock() if condition is None else condition
+        self.heap = []
+        self.queued = set()
+        self.active = set()  # Ids returned by get that are not marked as done yet
+        self.repeated = set()  # Active ids that were put again
+        self.dropped = 0  # Requests removed by retain before any work was spent on them
+        self.coalesced = 0  # Requests merged into a request for the same id that was still waiting
+
+    @property
+    def unfinished_tasks(self) -> int:
+        return len(self.queued) + len(self.active)
+
+    def get_priority(self, chunk_id: tuple) -> int:
+        distance = sum(((chunk_id[i] - self.center[i]) // self.chunk_size) ** 2 for i in range(3))
+
+        return -distance if self.reverse else distance
+
+    def empty(self) -> bool:
+        return not self.queued
+
+    def put(self, chunk_id: tuple) -> None:
+        with self.lock:
+            if chunk_id in self.queued or chunk_id in self.repeated:
+                self.coalesced += 1
+                return
+
+            if chunk_id in self.active:
+                if self.repeat_active:
+                    self.repeated.add(chunk_id)
+
+                return
+
+            self.push(chunk_id)
+
+    def push(self, chunk_id: tuple) -> None:
+        # Has to be called with the lock held
+        self.queued.add(chunk_id)
+        heapq.heappush(self.heap, (self.get_priority(chunk_id), chunk_id))
+
+        if self.condition is not None:
+            self.condition.notify()
+
+    def get(self) -> tuple:
+        # Returns the chunk id with the highest priority or None if the queue is empty
+        with self.lock:
+            if not self.heap:
+                return None
+
+            _, chunk_id = heapq.heappop(self.heap)
+            self.queued.discard(chunk_id)
+            self.active.add(chunk_id)
+
+            return chunk_id
+
+    def get_active(self) -> set:
+        with self.lock:
+            return self.active.copy()
+
+    def task_done(self, chunk_id: tuple) -> None:
+        with self.lock:
+            self.active.discard(chunk_id)
+
+            if chunk_id in self.repeated:
+                self.repeated.discard(chunk_id)
+                self.push(chunk_id)
+
+    def retain(self, center: tuple, keep) -> None:
+        # Drops queued ids for which keep returns false and orders the rest by their distance to the new center
+        with self.lock:
+            self.center = center
+            queued = {chunk_id for chunk_id in self.queued if keep(chunk_id)}
+
+            self.dropped += len(self.queued) - len(queued)
+            self.queued = queued
+            self.repeated = {chunk_id for chunk_id in self.repeated if keep(chunk_id)}
+            self.heap = [(self.get_priority(chunk_id), chunk_id) for chunk_id in queued]
+            heapq.heapify(self.heap)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.heap.clear()
+            self.queued.clear()
+            self.active.clear()
+            self.repeated.clear()
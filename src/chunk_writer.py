@@ -0,0 +1,91 @@
+import threading
+
+from ursina import print_warning
+
+
+class ChunkWriter:
+    # Write-behind queue for chunk saves. A background thread encodes and writes queued chunks in batches, a chunk that
+    # is queued again before it was written only keeps its latest data.
+
+    def __init__(self, storage, encode, max_pending: int = 512, batch_size: int = 32) -> None:
+        self.storage = storage
+        self.encode = encode  # Called as encode(chunk_id, data) on the writer thread, returns the bytes to store
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+
+        self.pending = {}
+        self.writing = {}
+        self.coalesced = 0
+        self.written = 0
+        self.running = True
+
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="chunk_writer", daemon=True)
+        self.thread.start()
+
+    @property
+    def backlog(self) -> int:
+        return len(self.pending) + len(self.writing)
+
+    def put(self, chunk_id: tuple, data) -> None:
+        with self.condition:
+            if chunk_id in self.pending:
+                self.coalesced += 1
+
+            else:
+                while len(self.pending) >= self.max_pending:
+                    self.condition.wait()
+
+            self.pending[chunk_id] = data
+            self.condition.notify_all()
+
+    def get(self, chunk_id: tuple):
+        # Returns a copy of data that is queued but not yet written, so a chunk can be loaded again before its save finished
+        with self.condition:
+            data = self.pending.get(chunk_id)
+
+            if data is None:
+                data = self.writing.get(chunk_id)
+
+            return None if data is None else data.copy()
+
+    def flush(self) -> None:
+        with self.condition:
+            while self.pending or self.writing:
+                self.condition.wait()
+
+    def close(self) -> None:
+        self.flush()
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        self.thread.join()
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+
+                if not self.pending:
+                    return
+
+                for chunk_id in list(self.pending)[: self.batch_size]:
+                    self.writing[chunk_id] = self.pending.pop(chunk_id)
+
+                # Sorting by location keeps writes to the same region file together
+                batch = sorted(self.writing.items(), key=lambda item: self.storage.get_location(item[0]))
+                self.condition.notify_all()
+
+            for chunk_id, data in batch:
+                try:
+                    self.storage.write(chunk_id, self.encode(chunk_id, data))
+                except Exception as exception:
+                    print_warning(f"Failed to save chunk {chunk_id} \n {exception}")
+
+            with self.condition:
+                self.writing.clear()
+                self.written += len(batch)
+                self.condition.notify_all()
@@ -3,6 +3,8 @@ from fast_noise_lite cimport *
 
 cimport numpy as np
 import numpy as np
+from collections import OrderedDict
+from threading import Lock
 
 
 np.import_array()
@@ -18,16 +20,134 @@ noise2d.gain = 1
 noise2d.octaves = 4
 
 
-def generate_data(int chunk_size, int seed, int chunk_x, int chunk_y, int chunk_z):
-    cdef int i, index, x, y, z, world_y, diff, height
-    cdef np.ndarray[unsigned char, ndim=1] voxel_data = np.zeros(chunk_size**3, dtype=np.ubyte)
+class HeightmapCache:
+    # Thread safe LRU cache of terrain heights per chunk column, chunks stacked on top of each other share one entry
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            heights = self.entries.get(key)
+
+            if heights is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+
+            return heights
+
+    def put(self, key, heights):
+        with self.lock:
+            self.entries[key] = heights
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+heightmap_cache = HeightmapCache()
+
+
+def generate_heightmap(int chunk_size, int seed, int chunk_x, int chunk_z):
+    cdef int i, x, z
+    cdef np.ndarray[int, ndim=1] heights = np.empty(chunk_size**2, dtype=np.intc)
+    noise2d.seed = seed
+
+    with nogil:
+        for i in range(chunk_size**2):
+            x = i / chunk_size
+            z = i % chunk_size
+            heights[i] = <int>(fnlGetNoise2D(&noise2d, x + chunk_x, z + chunk_z) * amp2d + y_offset)
+
+    return heights
+
+
+def get_heightmap(int chunk_size, int seed, int chunk_x, int chunk_z):
+    heights = heightmap_cache.get((seed, chunk_x, chunk_z))
+
+    if heights is None:
+        heights = generate_heightmap(chunk_size, seed, chunk_x, chunk_z)
+        heightmap_cache.put((seed, chunk_x, chunk_z), heights)
+
+    return heights
+
+
+def generate_lod_heightmap(int chunk_size, int seed, int chunk_x, int chunk_z, int scale):
+    # Terrain heights of a chunk column sampled once per scale x scale cell, scale 1 matches generate_heightmap
+    cdef int i, x, z
+    cdef int cells = chunk_size / scale
+    cdef np.ndarray[int, ndim=1] heights = np.empty(cells**2, dtype=np.intc)
     noise2d.seed = seed
 
+    with nogil:
+        for i in range(cells**2):
+            x = i / cells * scale + scale / 2
+            z = i % cells * scale + scale / 2
+            heights[i] = <int>(fnlGetNoise2D(&noise2d, x + chunk_x, z + chunk_z) * amp2d + y_offset)
+
+    return heights
+
+
+def get_lod_heightmap(int chunk_size, int seed, int chunk_x, int chunk_z, int scale):
+    heights = heightmap_cache.get((seed, chunk_x, chunk_z, scale))
+
+    if heights is None:
+        heights = generate_lod_heightmap(chunk_size, seed, chunk_x, chunk_z, scale)
+        heightmap_cache.put((seed, chunk_x, chunk_z, scale), heights)
+
+    return heights
+
+
+def get_uniform_id(int chunk_size, int seed, int chunk_x, int chunk_y, int chunk_z):
+    # Returns the voxel id if generate_data would fill the whole chunk with it, otherwise -1
+    heights = get_heightmap(chunk_size, seed, chunk_x, chunk_z)
+    cdef int min_height = heights.min()
+    cdef int max_height = heights.max()
+    cdef int top = chunk_y + chunk_size - 1
+
+    if chunk_y > max_height:
+        if chunk_y > 0:
+            return 0  # air
+
+        if top <= 0:
+            return 5  # water
+
+    elif top <= min_height - 5:
+        return 3  # stone
+
+    return -1
+
+
+def generate_data(int chunk_size, int seed, int chunk_x, int chunk_y, int chunk_z, np.ndarray out=None, np.ndarray heightmap=None):
+    # If out is given the voxel data is written into it instead of a new array. heightmap can pass the terrain heights if
+    # they were already computed, for example by another process.
+    cdef int i, index, x, y, z, world_y, diff, height
+    cdef np.ndarray[unsigned char, ndim=1] voxel_data
+    cdef np.ndarray[int, ndim=1] heights = get_heightmap(chunk_size, seed, chunk_x, chunk_z) if heightmap is None else heightmap
+
+    if out is None:
+        voxel_data = np.zeros(chunk_size**3, dtype=np.ubyte)
+    else:
+        voxel_data = out
+        voxel_data.fill(0)
+
     with nogil:
         for i in range(chunk_size**2):
             x = i / chunk_size
             z = i % chunk_size
-            height = <int>(fnlGetNoise2D(&noise2d, x + chunk_x, z + chunk_z) * amp2d + y_offset)
+            height = heights[i]
 
             for y in range(chunk_size):
                 index = x * chunk_size * chunk_size + y * chunk_size + z
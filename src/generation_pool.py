@@ -0,0 +1,91 @@
+import contextlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from data_generator import generate_data
+
+_attached_blocks = {}  # Shared memory blocks opened by a worker process
+
+
+def _generate(block_name: str, offset: int, chunk_size: int, seed: int, chunk_id: tuple, heights: np.ndarray) -> None:
+    # Runs in a worker process and writes the voxel data straight into the shared memory slot. The heightmap comes from
+    # the main process, which already computed it to detect uniform chunks.
+    if block_name not in _attached_blocks:
+        _attached_blocks[block_name] = shared_memory.SharedMemory(name=block_name)
+
+    block = _attached_blocks[block_name]
+    generate_data(chunk_size, seed, *chunk_id, np.ndarray(chunk_size**3, dtype=np.ubyte, buffer=block.buf, offset=offset), heights)
+
+
+class GenerationPool:
+    # Generates chunks in a process pool. Voxel data lives in slots of shared memory blocks, so the arrays returned by
+    # generate are views into shared memory and have to be given back with release once they are no longer used.
+
+    def __init__(self, chunk_size: int, seed: int, workers: int, slots_per_block: int = 256) -> None:
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.workers = workers
+        self.slot_size = chunk_size**3
+        self.slots_per_block = slots_per_block
+
+        self.lock = threading.Lock()
+        self.blocks = []
+        self.free_slots = []
+        self.used_slots = {}  # Data address of a slot view -> (block index, offset)
+
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def acquire(self) -> tuple:
+        with self.lock:
+            if not self.free_slots:
+                block = shared_memory.SharedMemory(create=True, size=self.slot_size * self.slots_per_block)
+                self.blocks.append(block)
+
+                for i in reversed(range(self.slots_per_block)):
+                    self.free_slots.append((len(self.blocks) - 1, i * self.slot_size))
+
+            return self.free_slots.pop()
+
+    def generate(self, chunk_id: tuple, heights: np.ndarray) -> np.ndarray:
+        block_index, offset = slot = self.acquire()
+        block = self.blocks[block_index]
+
+        try:
+            self.executor.submit(_generate, block.name, offset, self.chunk_size, self.seed, chunk_id, heights).result()
+        except Exception:
+            with self.lock:
+                self.free_slots.append(slot)
+
+            raise
+
+        data = np.ndarray(self.slot_size, dtype=np.ubyte, buffer=block.buf, offset=offset)
+
+        with self.lock:
+            self.used_slots[data.ctypes.data] = slot
+
+        return data
+
+    def release(self, data: np.ndarray) -> None:
+        with self.lock:
+            slot = self.used_slots.pop(data.ctypes.data, None)
+
+            if slot is not None:
+                self.free_slots.append(slot)
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+        with self.lock:
+            for block in self.blocks:
+                block.unlink()
+
+                # Views into the block may still be alive, the memory is freed once they are gone
+                with contextlib.suppress(BufferError):
+                    block.close()
+
+            self.blocks.clear()
+            self.free_slots.clear()
+            self.used_slots.clear()
@@ -1,3 +1,4 @@
+from data_generator import heightmap_cache
 from ursina import Animator, Button, CheckBox, Entity, Func, Quad, Text, Vec2, camera, color, time, window
 
 from .chunk_manager import chunk_manager
@@ -382,10 +383,10 @@ class Inventory(Entity):
         self.button_parent = Entity(parent=self, z=-1)
         self._background_panel = Entity(parent=self, model=Quad(aspect=1 / 0.8, radius=0.02), color=color.black50, scale=Vec2(1, 0.8), z=1)
 
-        for i in range(resource_loader.type_count):
+        for i, voxel_id in enumerate(resource_loader.voxel_ids):
             ItemButton(
                 parent=self.button_parent,
-                voxel_id=i + 1,
+                voxel_id=voxel_id,
                 x=(i % self.max_buttons_x) * 0.1 - 0.45,
                 y=-(i // self.max_buttons_x) * 0.1 + 0.35,
             )
@@ -480,6 +481,14 @@ class DebugOverlay(Entity):
         self.chunks_to_load = Text(parent=self, position=Vec2(0, -0.1), color=color.orange)
         self.chunks_to_unload = Text(parent=self, position=Vec2(0, -0.13), color=color.orange)
         self.chunks_to_update = Text(parent=self, position=Vec2(0, -0.16), color=color.orange)
+        self.chunks_to_save = Text(parent=self, position=Vec2(0, -0.19), color=color.orange)
+        self.heightmap_cache = Text(parent=self, position=Vec2(0, -0.23), color=color.lime)
+        self.chunk_memory = Text(parent=self, position=Vec2(0, -0.26), color=color.lime)
+        self.prefetch = Text(parent=self, position=Vec2(0, -0.29), color=color.lime)
+        self.mesh_cache = Text(parent=self, position=Vec2(0, -0.32), color=color.lime)
+        self.hidden_chunks = Text(parent=self, position=Vec2(0, -0.35), color=color.lime)
+        self.meshes = Text(parent=self, position=Vec2(0, -0.38), color=color.lime)
+        self.mesh_uploads = Text(parent=self, position=Vec2(0, -0.41), color=color.lime)
 
         self.position = window.top_left
 
@@ -505,9 +514,35 @@ class DebugOverlay(Entity):
         self.coordinates.text = f"Position : {round(player.position.x)}  {round(player.position.y)}  {round(player.position.z)}"
         self.direction.text = f"Facing : {heading}"
         self.updating_chunks.text = f"Updating chunks : {chunk_manager.updating}"
-        self.chunks_to_load.text = f"Chunks to load : {chunk_manager.chunks_to_load.unfinished_tasks}"
+        load_queue = chunk_manager.chunks_to_load
+        self.chunks_to_load.text = f"Chunks to load : {load_queue.unfinished_tasks}  ({load_queue.dropped} dropped)"
         self.chunks_to_unload.text = f"Chunks to unload : {chunk_manager.chunks_to_unload.unfinished_tasks}"
         self.chunks_to_update.text = f"Meshes to update : {chunk_manager.meshes_to_update.unfinished_tasks}"
+        self.chunks_to_save.text = f"Chunks to save : {chunk_manager.chunk_writer.backlog if chunk_manager.chunk_writer else 0}"
+        # Generation processes get their heightmaps from the main process, so its cache sees every lookup
+        self.heightmap_cache.text = f"Heightmap cache : {heightmap_cache.hits} hits  {heightmap_cache.misses} misses"
+        self.chunk_memory.text = f"Chunk memory : {sum(chunk.nbytes for chunk in list(chunk_manager.loaded_chunks.values())) / 2**20:.1f} MB"
+        self.prefetch.text = (
+            f"Prefetch : {len(chunk_manager.prefetched_chunks)} queued  "
+            f"{chunk_manager.chunks_reached_unmeshed} of {chunk_manager.chunks_reached} chunks reached unmeshed"
+        )
+
+        if mesh_cache := chunk_manager.mesh_cache:
+            self.mesh_cache.text = f"Mesh cache : {mesh_cache.hits} hits  {mesh_cache.misses} misses"
+        else:
+            self.mesh_cache.text = "Mesh cache : disabled"
+
+        self.hidden_chunks.text = f"Hidden chunks : {chunk_manager.hidden_chunks} of {len(chunk_manager.chunk_objects)}"
+        self.meshes.text = (
+            f"Meshes : {chunk_manager.meshes_generated} generated  "
+            f"{chunk_manager.meshes_avoided + chunk_manager.meshes_to_update.coalesced} avoided  "
+            f"{len(chunk_manager.waiting_meshes)} waiting"
+        )
+        uploads = chunk_manager.mesh_uploads
+        self.mesh_uploads.text = (
+            f"Mesh uploads : {uploads.backlog} waiting  {uploads.replaced} replaced  "
+            f"{uploads.frame_meshes} meshes  {uploads.frame_bytes / 2**10:.0f} KB last frame"
+        )
 
 
 gui = Gui()
@@ -0,0 +1,95 @@
+import hashlib
+import threading
+
+import blosc
+import numpy as np
+from voxel_storage import PaletteChunk
+
+from .chunk_writer import ChunkWriter
+from .region_file import RegionStorage
+
+MESH_FORMAT = b"mesh1"  # Changes whenever the vertex layout of generate_mesh changes
+KEY_SIZE = 16
+MISSING_DIGEST = bytes(KEY_SIZE)
+
+
+class MeshCache:
+    # Vertex data of meshed chunks stored next to the chunk saves. A stored mesh is only used if its key matches, the key
+    # hashes the voxel data of the chunk and its six neighbors together with the voxel type table and the mesh settings.
+
+    def __init__(self, path: str, chunk_size: int, texture_types: np.ndarray, occlusion_types: np.ndarray) -> None:
+        self.storage = RegionStorage(path, chunk_size)
+        self.writer = ChunkWriter(self.storage, lambda chunk_id, data: bytes(data))
+
+        type_table = hashlib.blake2b(MESH_FORMAT, digest_size=KEY_SIZE)
+        type_table.update(texture_types.astype("<i4").tobytes())
+        type_table.update(occlusion_types.astype("<i4").tobytes())
+        self.type_digest = type_table.digest()
+
+        self.lock = threading.Lock()
+        self.digests = {}  # Chunk id -> (chunk, digest of its voxel data)
+        self.hits = 0
+        self.misses = 0
+
+    def get_digest(self, chunk_id: tuple, chunk: PaletteChunk) -> bytes:
+        if chunk is None:
+            return MISSING_DIGEST
+
+        with self.lock:
+            entry = self.digests.get(chunk_id)
+
+        if entry is not None and entry[0] is chunk:
+            return entry[1]
+
+        digest = hashlib.blake2b(chunk.bits.to_bytes(1, "little"), digest_size=KEY_SIZE)
+        digest.update(chunk.palette_array[: chunk.palette_size].tobytes())
+        digest.update(chunk.words_array.tobytes())
+        digest = digest.digest()
+
+        with self.lock:
+            self.digests[chunk_id] = (chunk, digest)
+
+        return digest
+
+    def invalidate(self, chunk_id: tuple) -> None:
+        # Has to be called whenever the voxel data of a chunk changes in place
+        with self.lock:
+            self.digests.pop(chunk_id, None)
+
+    def get_key(self, chunk_ids: list, chunks: list, greedy: bool) -> bytes:
+        key = hashlib.blake2b(self.type_digest, digest_size=KEY_SIZE)
+        key.update(b"\x01" if greedy else b"\x00")
+
+        for chunk_id, chunk in zip(chunk_ids, chunks, strict=True):
+            key.update(self.get_digest(chunk_id, chunk))
+
+        return key.digest()
+
+    def get(self, chunk_id: tuple, key: bytes) -> tuple:
+        # Returns the opaque and translucent vertex data stored for key, None if the mesh is not cached
+        blob = self.writer.get(chunk_id)
+
+        if blob is None:
+            blob = self.storage.read(chunk_id)
+
+        if blob is None or blob[:KEY_SIZE] != key:
+            self.misses += 1
+            return None
+
+        data = blosc.decompress(bytes(blob[KEY_SIZE:]))
+        opaque_size = int(np.frombuffer(data, dtype="<u4", count=1)[0])
+        vertex_data = np.frombuffer(data, dtype="<u4", offset=4).astype(np.uintc)
+
+        self.hits += 1
+        return vertex_data[:opaque_size], vertex_data[opaque_size:]
+
+    def put(self, chunk_id: tuple, key: bytes, vertex_data: np.ndarray, translucent_data: np.ndarray) -> None:
+        header = np.array([len(vertex_data)], dtype="<u4").tobytes()
+        data = header + vertex_data.astype("<u4").tobytes() + translucent_data.astype("<u4").tobytes()
+
+        # Stored as bytearray, queued data is handed out as a copy when the mesh is read before it was written
+        self.writer.put(chunk_id, bytearray(key + blosc.compress(data, typesize=4, cname="lz4")))
+
+    def close(self) -> None:
+        self.writer.close()
+        self.storage.close()
@@ -1,72 +1,90 @@
 # cython: boundscheck=False, wraparound=False, initializedcheck=False, cdivision=True
 cimport numpy as np
 import numpy as np
+from voxel_storage cimport ChunkView, PaletteChunk, view_get
 
 
 np.import_array()
 
-cdef int[18] face_0 = [0, 0, 0,
+# Corners of each face, the shared index buffer of VoxelChunk splits them into the triangles 0 1 2 and 2 3 0
+cdef int[12] face_0 = [0, 0, 0,
                        0, 1, 0,
                        0, 1, 1,
-                       0, 1, 1,
-                       0, 0, 1,
-                       0, 0, 0,]
+                       0, 0, 1,]
 
-cdef int[18] face_1 = [0, 0, 0,
+cdef int[12] face_1 = [0, 0, 0,
                        0, 0, 1,
                        1, 0, 1,
-                       1, 0, 1,
-                       1, 0, 0,
-                       0, 0, 0,]
+                       1, 0, 0,]
 
-cdef int[18] face_2 = [0, 0, 0,
+cdef int[12] face_2 = [0, 0, 0,
                        1, 0, 0,
                        1, 1, 0,
-                       1, 1, 0,
-                       0, 1, 0,
-                       0, 0, 0,]
+                       0, 1, 0,]
 
-cdef int[18] face_3 = [1, 0, 0,
+cdef int[12] face_3 = [1, 0, 0,
                        1, 0, 1,
                        1, 1, 1,
-                       1, 1, 1,
-                       1, 1, 0,
-                       1, 0, 0,]
+                       1, 1, 0,]
 
-cdef int[18] face_4 = [0, 1, 0,
+cdef int[12] face_4 = [0, 1, 0,
                        1, 1, 0,
                        1, 1, 1,
-                       1, 1, 1,
-                       0, 1, 1,
-                       0, 1, 0,]
+                       0, 1, 1,]
 
-cdef int[18] face_5 = [0, 0, 1,
+cdef int[12] face_5 = [0, 0, 1,
                        0, 1, 1,
                        1, 1, 1,
-                       1, 1, 1,
-                       1, 0, 1,
-                       0, 0, 1,]
+                       1, 0, 1,]
 
 cdef int[18] neighbor_offsets = [-1,0,0,  0,-1,0,  0,0,-1,  1,0,0,  0,1,0,  0,0,1]
 
+cdef const int *faces[6]
+faces[0] = face_0
+faces[1] = face_1
+faces[2] = face_2
+faces[3] = face_3
+faces[4] = face_4
+faces[5] = face_5
 
-cdef void copy_face(int index, int x, int y, int z, int texture_id, int normal_id, const int *face, unsigned int *vertex_data) noexcept nogil:
+
+cdef void copy_quad(
+    int index, int x, int y, int z, int size_x, int size_y, int size_z, int texture_id, int normal_id, const int *face, unsigned int *vertex_data
+) noexcept nogil:
     cdef int i, x_position, y_position, z_position
 
-    for i in range(6):
-        x_position = face[i * 3 + 0] + x
-        y_position = face[i * 3 + 1] + y
-        z_position = face[i * 3 + 2] + z
+    for i in range(4):
+        x_position = face[i * 3 + 0] * size_x + x
+        y_position = face[i * 3 + 1] * size_y + y
+        z_position = face[i * 3 + 2] * size_z + z
 
-        # pack vertex data into uint32
-        vertex_data[index * 6 + i] = x_position | y_position << 6 | z_position << 12 | normal_id << 18 | texture_id << 21
+        # pack vertex data into uint32, the texture id uses the upper 11 bits
+        vertex_data[index * 4 + i] = x_position | y_position << 6 | z_position << 12 | normal_id << 18 | <unsigned int>texture_id << 21
 
 
-cdef int check_occlusion(int chunk_size, int index, int x, int y, int z, int *occlusion_types, unsigned char *occlusion_state, unsigned char *voxel_data, long long *neighbors) noexcept nogil:
+cdef inline void copy_face(int index, int x, int y, int z, int texture_id, int normal_id, const int *face, unsigned int *vertex_data) noexcept nogil:
+    copy_quad(index, x, y, z, 1, 1, 1, texture_id, normal_id, face, vertex_data)
+
+
+cdef inline int face_texture(int *texture_types, unsigned short voxel_id, int normal_id) noexcept nogil:
+    if normal_id == 4:
+        return texture_types[voxel_id * 3 - 3]
+
+    if normal_id == 1:
+        return texture_types[voxel_id * 3 - 2]
+
+    return texture_types[voxel_id * 3 - 1]
+
+
+cdef int check_occlusion(
+    int chunk_size, int index, int x, int y, int z, int *occlusion_types, unsigned char *occlusion_state, unsigned short *voxel_data,
+    ChunkView *neighbors
+) noexcept nogil:
     cdef int i, x_position, y_position, z_position, face_count = 0
-    cdef unsigned char voxel_id = voxel_data[x * chunk_size * chunk_size + y * chunk_size + z]
-    cdef unsigned char neighbor_id, result = 0
-    cdef unsigned char *neighbor_chunk
+    cdef unsigned short voxel_id = voxel_data[x * chunk_size * chunk_size + y * chunk_size + z]
+    cdef unsigned short neighbor_id
+    cdef unsigned char result = 0
+    cdef ChunkView *neighbor_chunk
 
     for i in range(6):
         x_position = neighbor_offsets[i * 3 + 0] + x
@@ -74,34 +92,37 @@ cdef int check_occlusion(int chunk_size, int index, int x, int y, int z, int *oc
         z_position = neighbor_offsets[i * 3 + 2] + z
 
         if x_position < 0:
-            neighbor_chunk = <unsigned char*>neighbors[0]
+            neighbor_chunk = &neighbors[0]
             x_position += chunk_size
 
         elif x_position >= chunk_size:
-            neighbor_chunk = <unsigned char*>neighbors[3]
+            neighbor_chunk = &neighbors[3]
             x_position -= chunk_size
 
         elif y_position < 0:
-            neighbor_chunk = <unsigned char*>neighbors[1]
+            neighbor_chunk = &neighbors[1]
             y_position += chunk_size
 
         elif y_position >= chunk_size:
-            neighbor_chunk = <unsigned char*>neighbors[4]
+            neighbor_chunk = &neighbors[4]
             y_position -= chunk_size
 
         elif z_position < 0:
-            neighbor_chunk = <unsigned char*>neighbors[2]
+            neighbor_chunk = &neighbors[2]
             z_position += chunk_size
 
         elif z_position >= chunk_size:
-            neighbor_chunk = <unsigned char*>neighbors[5]
+            neighbor_chunk = &neighbors[5]
             z_position -= chunk_size
 
         else:
-            neighbor_chunk = voxel_data
+            neighbor_chunk = NULL
+
+        if not neighbor_chunk:
+            neighbor_id = voxel_data[x_position * chunk_size * chunk_size + y_position * chunk_size + z_position]
 
-        if neighbor_chunk:
-            neighbor_id = neighbor_chunk[x_position * chunk_size * chunk_size + y_position * chunk_size + z_position]
+        elif neighbor_chunk.palette:
+            neighbor_id = view_get(neighbor_chunk, x_position * chunk_size * chunk_size + y_position * chunk_size + z_position)
 
         else:
             continue
@@ -117,63 +138,543 @@ cdef int check_occlusion(int chunk_size, int index, int x, int y, int z, int *oc
     return face_count
 
 
-def generate_mesh(int chunk_size, int [:] texture_types, int [:] occlusion_types, unsigned char [:]voxel_data, long long [:]neighbors):
-    cdef int i, x, y, z, side, up, down, occlusion
-    cdef int face_count = 0
+cdef int check_border_occlusion(
+    int chunk_size, int *occlusion_types, unsigned char *border_state, unsigned short voxel_id, ChunkView *neighbors
+) noexcept nogil:
+    # Occlusion of a chunk filled with a single voxel id, faces can only be exposed on the borders to neighboring chunks.
+    # border_state holds a chunk_size**2 plane for every direction, indexed like the masks of emit_greedy_faces.
+    cdef int i, j, axis, neighbor_index, face_count = 0
+    cdef int[3] neighbor_position
+    cdef unsigned short neighbor_id
+
+    for i in range(6):
+        if not neighbors[i].palette:
+            continue
+
+        axis = i % 3
+        neighbor_position[axis] = 0 if i >= 3 else chunk_size - 1
+
+        for j in range(chunk_size**2):
+            neighbor_position[(axis + 1) % 3] = j / chunk_size
+            neighbor_position[(axis + 2) % 3] = j % chunk_size
+
+            neighbor_index = neighbor_position[0] * chunk_size * chunk_size + neighbor_position[1] * chunk_size + neighbor_position[2]
+            neighbor_id = view_get(&neighbors[i], neighbor_index)
+
+            if neighbor_id == voxel_id:
+                continue
+
+            if not neighbor_id or not occlusion_types[neighbor_id - 1]:
+                border_state[i * chunk_size**2 + j] = 1
+                face_count += 1
+
+    return face_count
+
+
+cdef int border_occlusion(int chunk_size, int x, int y, int z, unsigned char *border_state) noexcept nogil:
+    # Occlusion state of a voxel of a uniform chunk from the border planes it lies on
+    cdef int i, axis, result = 0
+    cdef int[3] position = [x, y, z]
+
+    for i in range(6):
+        axis = i % 3
+
+        if position[axis] != (chunk_size - 1 if i >= 3 else 0):
+            continue
+
+        if border_state[i * chunk_size**2 + position[(axis + 1) % 3] * chunk_size + position[(axis + 2) % 3]]:
+            result |= 1 << i
+
+    return result
+
+
+cdef inline void section_origin(int chunk_size, int section_size, int section, int *origin) noexcept nogil:
+    # Sections are numbered like voxels, with section_size voxels per step
+    cdef int sections_per_axis = chunk_size / section_size
+
+    origin[0] = section / (sections_per_axis * sections_per_axis) * section_size
+    origin[1] = section / sections_per_axis % sections_per_axis * section_size
+    origin[2] = section % sections_per_axis * section_size
+
+
+cdef void check_section_occlusion(
+    int chunk_size, int section_size, int *sections, int section_count, int *occlusion_types, unsigned char *occlusion_state,
+    unsigned short *voxel_data, ChunkView *neighbors, int *face_counts
+) noexcept nogil:
+    cdef int i, s, x, y, z
+    cdef int[3] origin
+
+    for s in range(section_count):
+        section_origin(chunk_size, section_size, sections[s], origin)
+
+        for x in range(origin[0], origin[0] + section_size):
+            for y in range(origin[1], origin[1] + section_size):
+                for z in range(origin[2], origin[2] + section_size):
+                    i = x * chunk_size * chunk_size + y * chunk_size + z
+
+                    if not voxel_data[i]:
+                        continue
+
+                    face_counts[not occlusion_types[voxel_data[i] - 1]] += check_occlusion(
+                        chunk_size, i, x, y, z, occlusion_types, occlusion_state, voxel_data, neighbors
+                    )
+
+
+cdef void copy_faces(int x, int y, int z, int occlusion, int side, int up, int down, unsigned int *vertex_data, int *count) noexcept nogil:
+    if occlusion & 32:
+        copy_face(count[0], x, y, z, side, 5, face_5, vertex_data)
+        count[0] += 1
+
+    if occlusion & 16:
+        copy_face(count[0], x, y, z, up, 4, face_4, vertex_data)
+        count[0] += 1
+
+    if occlusion & 8:
+        copy_face(count[0], x, y, z, side, 3, face_3, vertex_data)
+        count[0] += 1
+
+    if occlusion & 4:
+        copy_face(count[0], x, y, z, side, 2, face_2, vertex_data)
+        count[0] += 1
+
+    if occlusion & 2:
+        copy_face(count[0], x, y, z, down, 1, face_1, vertex_data)
+        count[0] += 1
+
+    if occlusion & 1:
+        copy_face(count[0], x, y, z, side, 0, face_0, vertex_data)
+        count[0] += 1
+
+
+cdef void emit_faces(
+    int chunk_size, int section_size, int *sections, int section_count, int *texture_types, int *occlusion_types, unsigned short *voxel_data,
+    unsigned char *occlusion_state, unsigned int **streams, int *counts, int *offsets
+) noexcept nogil:
+    # Faces of voxels that do not occlude their neighbors are written to the translucent stream. Faces are written one
+    # section after the other, offsets receives the face counts of both streams after every section.
+    cdef int i, s, x, y, z, stream
+    cdef int[3] origin
+
+    for s in range(section_count):
+        section_origin(chunk_size, section_size, sections[s], origin)
+
+        for x in range(origin[0], origin[0] + section_size):
+            for y in range(origin[1], origin[1] + section_size):
+                for z in range(origin[2], origin[2] + section_size):
+                    i = x * chunk_size * chunk_size + y * chunk_size + z
+
+                    if not occlusion_state[i]:
+                        continue
+
+                    stream = not occlusion_types[voxel_data[i] - 1]
+                    copy_faces(
+                        x, y, z, occlusion_state[i], texture_types[voxel_data[i] * 3 - 1], texture_types[voxel_data[i] * 3 - 3],
+                        texture_types[voxel_data[i] * 3 - 2], streams[stream], &counts[stream]
+                    )
+
+        offsets[s + 1] = counts[0]
+        offsets[section_count + s + 2] = counts[1]
+
+
+cdef void emit_border_faces(
+    int chunk_size, int section_size, int *sections, int section_count, int *texture_types, unsigned short voxel_id, int stream,
+    unsigned char *border_state, unsigned int **streams, int *counts, int *offsets
+) noexcept nogil:
+    # Same order as emit_faces for a uniform chunk, columns inside the chunk only visit their first and last voxel
+    cdef int s, x, y, z
+    cdef int last = chunk_size - 1
+    cdef int side = texture_types[voxel_id * 3 - 1]
+    cdef int up = texture_types[voxel_id * 3 - 3]
+    cdef int down = texture_types[voxel_id * 3 - 2]
+    cdef int[3] origin
+    cdef unsigned int *vertex_data = streams[stream]
+    cdef int *count = &counts[stream]
+
+    for s in range(section_count):
+        section_origin(chunk_size, section_size, sections[s], origin)
+
+        for x in range(origin[0], origin[0] + section_size):
+            for y in range(origin[1], origin[1] + section_size):
+                if 0 < x < last and 0 < y < last:
+                    if origin[2] == 0:
+                        copy_faces(x, y, 0, border_occlusion(chunk_size, x, y, 0, border_state), side, up, down, vertex_data, count)
+
+                    if origin[2] + section_size == chunk_size:
+                        copy_faces(x, y, last, border_occlusion(chunk_size, x, y, last, border_state), side, up, down, vertex_data, count)
+
+                    continue
+
+                for z in range(origin[2], origin[2] + section_size):
+                    copy_faces(x, y, z, border_occlusion(chunk_size, x, y, z, border_state), side, up, down, vertex_data, count)
+
+        offsets[s + 1] = counts[0]
+        offsets[section_count + s + 2] = counts[1]
+
+
+cdef void merge_faces(int chunk_size, int i, int layer, int *mask, unsigned int **streams, int *counts) noexcept nogil:
+    # Writes the faces of direction i in one slice as rectangles and clears mask
+    cdef int j, k, u, v, width, height, key, stream
+    cdef int axis = i % 3
+    cdef int u_axis = (axis + 1) % 3
+    cdef int v_axis = (axis + 2) % 3
+    cdef int[3] position, size
+
+    position[axis] = layer
+
+    for j in range(chunk_size**2):
+        key = mask[j]
+
+        if not key:
+            continue
+
+        u = j / chunk_size
+        v = j % chunk_size
+
+        width = 1
+        while v + width < chunk_size and mask[j + width] == key:
+            width += 1
+
+        height = 1
+        while u + height < chunk_size:
+            for k in range(width):
+                if mask[j + height * chunk_size + k] != key:
+                    break
+            else:
+                height += 1
+                continue
+
+            break
+
+        for k in range(height):
+            for v in range(width):
+                mask[j + k * chunk_size + v] = 0
+
+        position[u_axis] = u
+        position[v_axis] = j % chunk_size
+        size[axis] = 1
+        size[u_axis] = height
+        size[v_axis] = width
+
+        stream = key & 1
+        copy_quad(counts[stream], position[0], position[1], position[2], size[0], size[1], size[2], (key >> 1) - 1, i, faces[i], streams[stream])
+        counts[stream] += 1
+
+
+cdef void emit_greedy_faces(
+    int chunk_size, int *texture_types, int *occlusion_types, unsigned short *voxel_data, unsigned char *occlusion_state, int *mask,
+    unsigned int **streams, int *counts
+) noexcept nogil:
+    # Merges exposed faces with the same direction, texture and stream into rectangles, one slice of the chunk at a time.
+    # mask holds (texture id + 1) << 1 | stream of every face in the current slice, 0 where there is none.
+    cdef int i, j, k, axis, layer
+    cdef int[3] position
+
+    for i in range(6):
+        axis = i % 3
+
+        for layer in range(chunk_size):
+            position[axis] = layer
+
+            for j in range(chunk_size**2):
+                position[(axis + 1) % 3] = j / chunk_size
+                position[(axis + 2) % 3] = j % chunk_size
+                k = position[0] * chunk_size * chunk_size + position[1] * chunk_size + position[2]
+
+                if occlusion_state[k] & (1 << i):
+                    mask[j] = (face_texture(texture_types, voxel_data[k], i) + 1) << 1 | (not occlusion_types[voxel_data[k] - 1])
+                else:
+                    mask[j] = 0
+
+            merge_faces(chunk_size, i, layer, mask, streams, counts)
+
+
+cdef void emit_greedy_border_faces(
+    int chunk_size, int *texture_types, unsigned short voxel_id, int stream, unsigned char *border_state, int *mask, unsigned int **streams,
+    int *counts
+) noexcept nogil:
+    # Faces of a uniform chunk only lie in the outer slice of every direction
+    cdef int i, j, key
+
+    for i in range(6):
+        key = (face_texture(texture_types, voxel_id, i) + 1) << 1 | stream
+
+        for j in range(chunk_size**2):
+            mask[j] = key if border_state[i * chunk_size**2 + j] else 0
+
+        merge_faces(chunk_size, i, chunk_size - 1 if i >= 3 else 0, mask, streams, counts)
+
+
+def generate_mesh(int chunk_size, int [:] texture_types, int [:] occlusion_types, PaletteChunk chunk, tuple neighbors, bint greedy=False):
+    # neighbors holds the six neighboring chunks in the order -x, -y, -z, +x, +y, +z, None for chunks that are not loaded.
+    # With greedy set, coplanar faces with the same texture are merged into larger quads. Returns the vertex data of the
+    # opaque and of the translucent faces.
+    cdef int[1] sections = [0]
+    cdef tuple result = mesh_sections(chunk_size, chunk_size, texture_types, occlusion_types, chunk, neighbors, sections, greedy)
+
+    return result[0], result[1]
+
+
+def generate_sections(
+    int chunk_size, int section_size, int [:] texture_types, int [:] occlusion_types, PaletteChunk chunk, tuple neighbors, int [:] sections=None
+):
+    # Meshes the given sections of section_size**3 voxels, all sections if None, with the faces of each section stored
+    # contiguously. Returns the vertex data of the opaque and of the translucent faces and a (2, len(sections) + 1) array
+    # with the first face of every section in both streams followed by the face count.
+    if sections is None:
+        sections = np.arange((chunk_size / section_size)**3, dtype=np.intc)
+
+    return mesh_sections(chunk_size, section_size, texture_types, occlusion_types, chunk, neighbors, sections, False)
+
+
+cdef tuple mesh_sections(
+    int chunk_size, int section_size, int [:] texture_types, int [:] occlusion_types, PaletteChunk chunk, tuple neighbors, int [:] sections,
+    bint greedy
+):
+    # Greedy meshing merges faces across the whole chunk and is only used with a single section covering it
+    cdef int i
+    cdef int section_count = len(sections)
+    cdef int[2] face_counts = [0, 0]
+    cdef int[2] counts = [0, 0]
+    cdef unsigned int *streams[2]
+    cdef list refs = []  # Keeps the neighbor arrays alive while they are read
+    cdef ChunkView[6] views
+    cdef np.ndarray[int, ndim=2] offsets = np.zeros((2, section_count + 1), dtype=np.intc)
+
+    for i in range(6):
+        if neighbors[i] is None:
+            views[i].palette = NULL
+        else:
+            views[i] = (<PaletteChunk>neighbors[i]).get_view(refs)
+
+    if (chunk.bits == 0 and not chunk.palette[0]) or not section_count:
+        return np.zeros(0, dtype=np.uintc), np.zeros(0, dtype=np.uintc), offsets
+
+    if chunk.bits == 0:
+        return mesh_uniform(chunk_size, section_size, texture_types, occlusion_types, chunk.palette[0], views, sections, greedy, offsets)
+
+    cdef np.ndarray[unsigned short, ndim=1] _voxel_data = chunk.to_array()
+    cdef unsigned short *voxel_data = &_voxel_data[0]
     cdef np.ndarray[unsigned char, ndim=1] _occlusion_state = np.zeros(chunk_size**3, dtype=np.ubyte)
     cdef unsigned char *occlusion_state = &_occlusion_state[0]
 
     with nogil:
-        for i in range(chunk_size**3):
-            if not voxel_data[i]:
-                continue
+        check_section_occlusion(
+            chunk_size, section_size, &sections[0], section_count, &occlusion_types[0], occlusion_state, voxel_data, views, face_counts
+        )
+
+    cdef np.ndarray opaque_data = np.zeros(face_counts[0] * 4, dtype=np.uintc)
+    cdef np.ndarray translucent_data = np.zeros(face_counts[1] * 4, dtype=np.uintc)
+    cdef np.ndarray[int, ndim=1] mask
+
+    if not face_counts[0] and not face_counts[1]:
+        return opaque_data, translucent_data, offsets
+
+    streams[0] = <unsigned int*>np.PyArray_DATA(opaque_data)
+    streams[1] = <unsigned int*>np.PyArray_DATA(translucent_data)
+
+    if not greedy:
+        with nogil:
+            emit_faces(
+                chunk_size, section_size, &sections[0], section_count, &texture_types[0], &occlusion_types[0], voxel_data, occlusion_state, streams,
+                counts, &offsets[0, 0]
+            )
+
+        return opaque_data[:counts[0] * 4], translucent_data[:counts[1] * 4], offsets
+
+    mask = np.zeros(chunk_size**2, dtype=np.intc)
+
+    with nogil:
+        emit_greedy_faces(chunk_size, &texture_types[0], &occlusion_types[0], voxel_data, occlusion_state, &mask[0], streams, counts)
+
+    offsets[0, 1] = counts[0]
+    offsets[1, 1] = counts[1]
+
+    return opaque_data[:counts[0] * 4], translucent_data[:counts[1] * 4], offsets
+
+
+cdef tuple mesh_uniform(
+    int chunk_size, int section_size, int [:] texture_types, int [:] occlusion_types, unsigned short voxel_id, ChunkView *views, int [:] sections,
+    bint greedy, np.ndarray[int, ndim=2] offsets
+):
+    # A chunk filled with a single voxel id only has faces on its border, it is meshed without unpacking its voxels. The
+    # faces are counted for the whole chunk, the vertex data is cut to the faces of the given sections.
+    cdef int face_count
+    cdef int section_count = len(sections)
+    cdef int stream = not occlusion_types[voxel_id - 1]
+    cdef int[2] counts = [0, 0]
+    cdef unsigned int *streams[2]
+    cdef np.ndarray[unsigned char, ndim=1] border_state = np.zeros(6 * chunk_size**2, dtype=np.ubyte)
+    cdef np.ndarray[int, ndim=1] mask
+
+    with nogil:
+        face_count = check_border_occlusion(chunk_size, &occlusion_types[0], &border_state[0], voxel_id, views)
+
+    cdef list data = [np.zeros(0, dtype=np.uintc), np.zeros(0, dtype=np.uintc)]
+    data[stream] = np.zeros(face_count * 4, dtype=np.uintc)
 
-            x = i / (chunk_size * chunk_size)
-            y = i / chunk_size % chunk_size
-            z = i % chunk_size
+    if not face_count:
+        return data[0], data[1], offsets
 
-            face_count += check_occlusion(chunk_size, i, x, y, z, &occlusion_types[0], occlusion_state, &voxel_data[0], &neighbors[0])
+    streams[stream] = <unsigned int*>np.PyArray_DATA(data[stream])
 
-    cdef np.ndarray[unsigned int, ndim=1] vertex_data = np.zeros(face_count * 6, dtype=np.uintc)
-    cdef int index = 0
+    if not greedy:
+        with nogil:
+            emit_border_faces(
+                chunk_size, section_size, &sections[0], section_count, &texture_types[0], voxel_id, stream, &border_state[0], streams, counts,
+                &offsets[0, 0]
+            )
+
+        return data[0][:counts[0] * 4], data[1][:counts[1] * 4], offsets
+
+    mask = np.zeros(chunk_size**2, dtype=np.intc)
+
+    with nogil:
+        emit_greedy_border_faces(chunk_size, &texture_types[0], voxel_id, stream, &border_state[0], &mask[0], streams, counts)
+
+    offsets[0, 1] = counts[0]
+    offsets[1, 1] = counts[1]
+
+    return data[0][:counts[0] * 4], data[1][:counts[1] * 4], offsets
+
+
+# Voxel ids of the terrain layers written by generate_data
+cdef enum:
+    DIRT = 1
+    GRASS = 2
+    STONE = 3
+    WATER = 5
+
+
+cdef int copy_wall(
+    int chunk_size, int *texture_types, int x, int z, int scale, int chunk_y, int height, int bottom, int normal_id, unsigned int *vertex_data,
+    int index
+) noexcept nogil:
+    # Side of a terrain column from height down to bottom, split into the grass, dirt and stone layers of generate_data
+    cdef int i, start, end
+    cdef int[3] layer_top = [height, height - 1, height - 5]
+    cdef int[3] layer_bottom = [height, height - 4, bottom]
+    cdef int[3] layer_id = [GRASS if height >= 0 else DIRT, DIRT, STONE]
+
+    for i in range(3):
+        start = max(layer_bottom[i], bottom, chunk_y)
+        end = min(layer_top[i], chunk_y + chunk_size - 1)
+
+        if start > end:
+            continue
+
+        copy_quad(
+            index, x, start - chunk_y, z, scale, end - start + 1, scale, texture_types[layer_id[i] * 3 - 1], normal_id, faces[normal_id], vertex_data
+        )
+        index += 1
+
+    return index
+
+
+def generate_lod_mesh(int chunk_size, int [:] texture_types, int [:] heights, int chunk_y, int scale):
+    # Mesh of a chunk built from terrain heights sampled once per scale x scale cell. Every cell becomes one column, the
+    # columns on the chunk border get skirts reaching one chunk down that hide cracks to chunks of other levels.
+    # Returns the vertex data of the opaque and of the translucent faces.
+    cdef int i, j, x, z, height, neighbor_height, bottom
+    cdef int cells = chunk_size / scale
+    cdef int opaque_count = 0, translucent_count = 0
+    cdef int[4] normal_ids = [0, 3, 2, 5]
+    cdef int[8] cell_offsets = [-1, 0,  1, 0,  0, -1,  0, 1]
+    cdef np.ndarray[unsigned int, ndim=1] opaque_data = np.zeros(cells**2 * 13 * 4, dtype=np.uintc)
+    cdef np.ndarray[unsigned int, ndim=1] translucent_data = np.zeros(cells**2 * 4, dtype=np.uintc)
+
+    with nogil:
+        for i in range(cells**2):
+            x = i / cells
+            z = i % cells
+            height = heights[i]
+
+            if chunk_y <= height < chunk_y + chunk_size:
+                copy_quad(
+                    opaque_count, x * scale, height - chunk_y, z * scale, scale, 1, scale, texture_types[(GRASS if height >= 0 else DIRT) * 3 - 3], 4,
+                    face_4, &opaque_data[0]
+                )
+                opaque_count += 1
+
+            if height < 0 and chunk_y <= 0 < chunk_y + chunk_size:
+                copy_quad(
+                    translucent_count, x * scale, -chunk_y, z * scale, scale, 1, scale, texture_types[WATER * 3 - 3], 4, face_4, &translucent_data[0]
+                )
+                translucent_count += 1
+
+            for j in range(4):
+                if 0 <= x + cell_offsets[j * 2] < cells and 0 <= z + cell_offsets[j * 2 + 1] < cells:
+                    neighbor_height = heights[(x + cell_offsets[j * 2]) * cells + z + cell_offsets[j * 2 + 1]]
+                    bottom = neighbor_height + 1
+                else:
+                    bottom = height - chunk_size + 1
+
+                if bottom <= height:
+                    opaque_count = copy_wall(
+                        chunk_size, &texture_types[0], x * scale, z * scale, scale, chunk_y, height, bottom, normal_ids[j], &opaque_data[0],
+                        opaque_count
+                    )
+
+    return opaque_data[:opaque_count * 4], translucent_data[:translucent_count * 4]
+
+
+def get_connectivity(int chunk_size, int [:] occlusion_types, PaletteChunk chunk):
+    # Flood fills the voxels that do not occlude their neighbors. Bit a * 6 + b of the result is set if the chunk faces a and
+    # b (in the order -x, -y, -z, +x, +y, +z) are connected through one of the filled regions.
+    cdef int i, j, k, x, y, z, x_position, y_position, z_position, index, neighbor_index, stack_size, faces_touched
+    cdef unsigned long long connectivity = 0
+
+    if chunk.bits == 0:
+        if not chunk.palette[0] or not occlusion_types[chunk.palette[0] - 1]:
+            return (1 << 36) - 1
+
+        return 0
+
+    cdef np.ndarray[unsigned short, ndim=1] _voxel_data = chunk.to_array()
+    cdef unsigned short *voxel_data = &_voxel_data[0]
+    cdef np.ndarray[unsigned char, ndim=1] _visited = np.zeros(chunk_size**3, dtype=np.ubyte)
+    cdef unsigned char *visited = &_visited[0]
+    cdef np.ndarray[int, ndim=1] _stack = np.empty(chunk_size**3, dtype=np.intc)
+    cdef int *stack = &_stack[0]
 
     with nogil:
         for i in range(chunk_size**3):
-            if not occlusion_state[i]:
+            if visited[i] or (voxel_data[i] and occlusion_types[voxel_data[i] - 1]):
                 continue
 
-            x = i / (chunk_size * chunk_size)
-            y = i / chunk_size % chunk_size
-            z = i % chunk_size
+            visited[i] = 1
+            stack[0] = i
+            stack_size = 1
+            faces_touched = 0
 
-            side = texture_types[voxel_data[i] * 3 - 1]
-            up   = texture_types[voxel_data[i] * 3 - 3]
-            down = texture_types[voxel_data[i] * 3 - 2]
+            while stack_size:
+                stack_size -= 1
+                index = stack[stack_size]
 
-            occlusion = occlusion_state[i]
+                x = index / (chunk_size * chunk_size)
+                y = index / chunk_size % chunk_size
+                z = index % chunk_size
 
-            if occlusion & 32:
-                copy_face(index, x, y, z, side, 5, face_5, &vertex_data[0])
-                index += 1
+                for j in range(6):
+                    x_position = neighbor_offsets[j * 3 + 0] + x
+                    y_position = neighbor_offsets[j * 3 + 1] + y
+                    z_position = neighbor_offsets[j * 3 + 2] + z
 
-            if occlusion & 16:
-                copy_face(index, x, y, z, up, 4, face_4, &vertex_data[0])
-                index += 1
+                    if not (0 <= x_position < chunk_size and 0 <= y_position < chunk_size and 0 <= z_position < chunk_size):
+                        faces_touched |= 1 << j
+                        continue
 
-            if occlusion & 8:
-                copy_face(index, x, y, z, side, 3, face_3, &vertex_data[0])
-                index += 1
+                    neighbor_index = x_position * chunk_size * chunk_size + y_position * chunk_size + z_position
 
-            if occlusion & 4:
-                copy_face(index, x, y, z, side, 2, face_2, &vertex_data[0])
-                index += 1
+                    if visited[neighbor_index] or (voxel_data[neighbor_index] and occlusion_types[voxel_data[neighbor_index] - 1]):
+                        continue
 
-            if occlusion & 2:
-                copy_face(index, x, y, z, down, 1, face_1, &vertex_data[0])
-                index += 1
+                    visited[neighbor_index] = 1
+                    stack[stack_size] = neighbor_index
+                    stack_size += 1
 
-            if occlusion & 1:
-                copy_face(index, x, y, z, side, 0, face_0, &vertex_data[0])
-                index += 1
+            for j in range(6):
+                for k in range(6):
+                    if faces_touched & (1 << j) and faces_touched & (1 << k):
+                        connectivity |= 1ULL << (j * 6 + k)
 
-    return vertex_data
+    return connectivity
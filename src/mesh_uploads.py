@@ -0,0 +1,75 @@
+import threading
+import time
+
+from .chunk_queue import ChunkQueue
+
+
+class MeshUploads:
+    # Finished meshes handed from the workers to the main thread, which owns every chunk object. Only the newest mesh of a
+    # chunk is kept and meshes closest to the center chunk are applied first. Every frame meshes are applied until the
+    # byte or the time budget is spent, at least one mesh is applied per frame.
+
+    def __init__(self, chunk_size: int) -> None:
+        self.lock = threading.Lock()
+        self.queue = ChunkQueue(chunk_size)
+        self.pending = {}  # Chunk id -> (mesh, size in bytes)
+        self.retired = []  # Chunk objects of unloaded chunks that are removed on the main thread
+        self.replaced = 0  # Meshes replaced by a newer mesh of the same chunk before they were applied
+        self.frame_bytes = 0  # Vertex data applied in the last frame
+        self.frame_meshes = 0
+
+    @property
+    def backlog(self) -> int:
+        return len(self.pending)
+
+    def put(self, chunk_id: tuple, mesh, size: int) -> None:
+        with self.lock:
+            if chunk_id in self.pending:
+                self.replaced += 1
+
+            self.pending[chunk_id] = (mesh, size)
+            self.queue.put(chunk_id)
+
+    def retire(self, chunk) -> None:
+        with self.lock:
+            self.retired.append(chunk)
+
+    def retain(self, center: tuple) -> None:
+        self.queue.retain(center, lambda chunk_id: True)
+
+    def apply(self, apply_mesh, max_bytes: int, max_time: float) -> None:
+        # Calls apply_mesh(chunk_id, mesh) for pending meshes, has to be called on the main thread. Removing retired nodes
+        # does not count against the budget, it would starve the uploads while many chunks are unloaded.
+        with self.lock:
+            retired, self.retired = self.retired, []
+
+        for chunk in retired:
+            chunk.remove_node()
+
+        start = time.perf_counter()
+        self.frame_bytes = 0
+        self.frame_meshes = 0
+
+        while self.frame_bytes < max_bytes and time.perf_counter() - start < max_time:
+            with self.lock:
+                chunk_id = self.queue.get()
+
+                if chunk_id is None:
+                    break
+
+                self.queue.task_done(chunk_id)
+                mesh, size = self.pending.pop(chunk_id)
+
+            apply_mesh(chunk_id, mesh)
+            self.frame_bytes += size
+            self.frame_meshes += 1
+
+    def clear(self) -> None:
+        # Drops pending meshes and removes retired chunk objects, has to be called on the main thread
+        with self.lock:
+            retired, self.retired = self.retired, []
+            self.pending.clear()
+            self.queue.clear()
+
+        for chunk in retired:
+            chunk.remove_node()
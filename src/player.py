@@ -47,31 +47,6 @@ class AABBCollider:
 
         return -min_dist, Vec3(normal_x, normal_y, normal_z)
 
-    def collide(self, collider, move_delta: Vec3) -> tuple:
-        def get_time(x: float, y: float) -> float:
-            return x / y if y else float("-" * (x > 0) + "inf")
-
-        x_entry = get_time(collider.x_1 - self.x_2 if move_delta.x > 0 else collider.x_2 - self.x_1, move_delta.x)
-        x_exit = get_time(collider.x_2 - self.x_1 if move_delta.x > 0 else collider.x_1 - self.x_2, move_delta.x)
-
-        y_entry = get_time(collider.y_1 - self.y_2 if move_delta.y > 0 else collider.y_2 - self.y_1, move_delta.y)
-        y_exit = get_time(collider.y_2 - self.y_1 if move_delta.y > 0 else collider.y_1 - self.y_2, move_delta.y)
-
-        z_entry = get_time(collider.z_1 - self.z_2 if move_delta.z > 0 else collider.z_2 - self.z_1, move_delta.z)
-        z_exit = get_time(collider.z_2 - self.z_1 if move_delta.z > 0 else collider.z_1 - self.z_2, move_delta.z)
-
-        entry_time = max(x_entry, y_entry, z_entry)
-        exit_time = min(x_exit, y_exit, z_exit)
-
-        if entry_time > exit_time or entry_time > 1 or entry_time < 0:
-            return 1, None
-
-        normal_x = (0, -1 if move_delta.x > 0 else 1)[entry_time == x_entry]
-        normal_y = (0, -1 if move_delta.y > 0 else 1)[entry_time == y_entry]
-        normal_z = (0, -1 if move_delta.z > 0 else 1)[entry_time == z_entry]
-
-        return entry_time, Vec3(normal_x, normal_y, normal_z)
-
 
 class Player(Entity):
     def __init__(self, **kwargs) -> None:
@@ -97,6 +72,8 @@ class Player(Entity):
 
         self.player_collider = AABBCollider(position=Vec3(0), origin=Vec3(0, -0.6, 0), scale=Vec3(0.8, 1.8, 0.8))
         self.voxel_collider = AABBCollider(position=Vec3(0), origin=Vec3(0), scale=Vec3(1))
+        self.box_min = (self.player_collider.x_1, self.player_collider.y_1, self.player_collider.z_1)  # Player box around its position
+        self.box_max = (self.player_collider.x_2, self.player_collider.y_2, self.player_collider.z_2)
 
         self.fov_multiplier = 1.12
         self.camera_pivot = Entity(parent=self)
@@ -118,49 +95,12 @@ class Player(Entity):
 
         from src.chunk_manager import chunk_manager
 
-        current_position = round(position, ndigits=0)
-        current_distance = 0
-
-        direction.normalize()
-
-        step_x = 1 if direction.x >= 0 else -1
-        step_y = 1 if direction.y >= 0 else -1
-        step_z = 1 if direction.z >= 0 else -1
-
-        delta_x = 10 if direction.x == 0 else 1 / direction.x * step_x
-        delta_y = 10 if direction.y == 0 else 1 / direction.y * step_y
-        delta_z = 10 if direction.z == 0 else 1 / direction.z * step_z
+        positions, normals, voxel_ids = chunk_manager.raycast(tuple(position), tuple(direction), max_distance)
 
-        x_distance = delta_x * (0.5 - (position.x - current_position.x) * step_x)
-        y_distance = delta_y * (0.5 - (position.y - current_position.y) * step_y)
-        z_distance = delta_z * (0.5 - (position.z - current_position.z) * step_z)
-
-        while current_distance < max_distance:
-            if x_distance < y_distance and x_distance < z_distance:
-                current_distance = x_distance
-                x_distance += delta_x
-                current_position.x += step_x
-                hit_normal = Vec3(-step_x, 0, 0)
-
-            elif y_distance < x_distance and y_distance < z_distance:
-                current_distance = y_distance
-                y_distance += delta_y
-                current_position.y += step_y
-                hit_normal = Vec3(0, -step_y, 0)
-
-            else:
-                current_distance = z_distance
-                z_distance += delta_z
-                current_position.z += step_z
-                hit_normal = Vec3(0, 0, -step_z)
-
-            voxel_id = chunk_manager.get_voxel_id(current_position)
-
-            if voxel_id:
-                self.selector.position = current_position
-                self.selector.hit_normal = hit_normal
-                self.selector.enabled = True
-                break
+        if voxel_ids[0]:
+            self.selector.position = Vec3(*positions[0].tolist())
+            self.selector.hit_normal = Vec3(*normals[0].tolist())
+            self.selector.enabled = True
 
     def update(self) -> None:
         from src.chunk_manager import chunk_manager
@@ -211,98 +151,12 @@ class Player(Entity):
             self.velocity.y = self.velocity.y - self.gravity * min(time.dt, 0.5)
             self.velocity.y = max(self.velocity.y, -self.max_fall_speed)
 
-            self.grounded = False
-            position = self.position
-            move_delta = self.velocity * time.dt
-            self.player_collider.position = position
-
-            possible_voxels = {}
-
-            for i in range(3 * 3 * 4):
-                offset = Vec3(
-                    i // 3 // 4 - 1,
-                    i // 3 % 4 - 2,
-                    i % 3 % 4 - 1,
-                )
-
-                voxel_id = chunk_manager.get_voxel_id(position + offset)
-
-                possible_voxels[offset] = voxel_id
-
-            for _ in range(3):
-                collisions = []
-
-                for offset, voxel_id in possible_voxels.items():
-                    if not voxel_id or not resource_loader.collision_types[voxel_id - 1]:
-                        continue
-
-                    self.voxel_collider.position = round(position + offset, ndigits=0)
-
-                    collision_time, normal = self.player_collider.collide(self.voxel_collider, move_delta)
-
-                    if normal is None:
-                        continue
-
-                    collisions.append((collision_time, normal))
-
-                if not collisions:
-                    break
-
-                collision_time, normal = min(collisions, key=lambda x: x[0])
-
-                if normal.x:
-                    self.velocity.x = 0
-                    move_delta.x = move_delta.x * collision_time
-
-                if normal.y:
-                    self.velocity.y = 0
-                    move_delta.y = move_delta.y * collision_time
-
-                if normal.z:
-                    self.velocity.z = 0
-                    move_delta.z = move_delta.z * collision_time
-
-                if normal.y == 1:
-                    self.grounded = True
-
-            for _ in range(3):
-                collisions = []
-                self.player_collider.position = position + move_delta
-
-                for offset, voxel_id in possible_voxels.items():
-                    if not voxel_id or not resource_loader.collision_types[voxel_id - 1]:
-                        continue
-
-                    self.voxel_collider.position = round(position + offset, ndigits=0)
-
-                    min_dist, normal = self.player_collider.intersect(self.voxel_collider)
-
-                    if normal is None:
-                        continue
-
-                    collisions.append((min_dist, normal))
-
-                if not collisions:
-                    break
-
-                min_dist, normal = min(collisions, key=lambda x: x[0])
-
-                if abs(min_dist) > 0.02:
-                    break
-
-                if normal.x:
-                    self.velocity.x = 0
-                    move_delta.x = min_dist * normal.x
-
-                if normal.y:
-                    self.velocity.y = 0
-                    move_delta.y = min_dist * normal.y
-
-                if normal.z:
-                    self.velocity.z = 0
-                    move_delta.z = min_dist * normal.z
+            moves, velocities, grounded, _ = chunk_manager.move_boxes(tuple(self.position), tuple(self.velocity), self.box_min, self.box_max, time.dt)
 
-            self.position += move_delta
+            self.velocity = Vec3(*velocities[0].tolist())
+            self.grounded = bool(grounded[0])
+            self.position += Vec3(*moves[0].tolist())
+            self.player_collider.position = self.position
 
         self.update_selector(position=self.camera_pivot.world_position, direction=self.camera_pivot.forward, max_distance=5)
 
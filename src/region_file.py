@@ -0,0 +1,206 @@
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+REGION_SIZE = 8  # Chunks per region along each axis
+SECTOR_SIZE = 512
+HEADER_ENTRIES = REGION_SIZE**3
+HEADER_SECTORS = -(-HEADER_ENTRIES * 3 * 4 // SECTOR_SIZE)
+
+
+class RegionFile:
+    # Stores up to REGION_SIZE**3 chunks in one file. The header holds one (sector offset, sector count, byte length)
+    # entry per chunk, the chunk data is stored in SECTOR_SIZE aligned slots behind it.
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self._mmap = None
+
+        if os.path.isfile(path):
+            self.file = open(path, "r+b")  # noqa: SIM115
+            self.header = np.frombuffer(self.file.read(HEADER_ENTRIES * 3 * 4), dtype="<u4").reshape(HEADER_ENTRIES, 3).copy()
+
+        else:
+            self.file = open(path, "w+b")  # noqa: SIM115
+            self.header = np.zeros((HEADER_ENTRIES, 3), dtype="<u4")
+            self.file.write(bytes(HEADER_SECTORS * SECTOR_SIZE))
+            self.file.flush()
+
+        self.file_sectors = max(HEADER_SECTORS, -(-os.path.getsize(path) // SECTOR_SIZE))
+        self.used_sectors = np.zeros(self.file_sectors, dtype=np.bool_)
+        self.used_sectors[:HEADER_SECTORS] = True
+
+        for offset, count, _ in self.header:
+            self.used_sectors[offset : offset + count] = True
+
+    def read(self, index: int) -> bytes:
+        with self.lock:
+            offset, _, length = (int(value) for value in self.header[index])
+
+            if not length:
+                return None
+
+            start = offset * SECTOR_SIZE
+
+            if self._mmap is None or len(self._mmap) < start + length:
+                self._remap()
+
+            return self._mmap[start : start + length]
+
+    def write(self, index: int, data: bytes) -> None:
+        with self.lock:
+            offset, count, _ = (int(value) for value in self.header[index])
+            needed = -(-len(data) // SECTOR_SIZE)
+
+            if needed <= count:
+                # Reuse the current slot and release the sectors that are no longer needed
+                self.used_sectors[offset + needed : offset + count] = False
+
+            else:
+                self.used_sectors[offset : offset + count] = False
+                offset = self._allocate(needed)
+
+            self.file.seek(offset * SECTOR_SIZE)
+            self.file.write(data)
+
+            self.header[index] = (offset, needed, len(data))
+            self.file.seek(index * 3 * 4)
+            self.file.write(self.header[index].tobytes())
+            self.file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+
+            self.file.close()
+
+    def _allocate(self, count: int) -> int:
+        # First fit search for a run of free sectors, appends to the end of the file if there is none
+        run_start = 0
+        run_length = 0
+
+        for i in np.flatnonzero(~self.used_sectors):
+            if run_length and i == run_start + run_length:
+                run_length += 1
+            else:
+                run_start = i
+                run_length = 1
+
+            if run_length == count:
+                self.used_sectors[run_start : run_start + count] = True
+                return int(run_start)
+
+        # A free run at the end of the file can be extended
+        offset = run_start if run_length and run_start + run_length == self.file_sectors else self.file_sectors
+
+        self.file_sectors = offset + count
+        self.used_sectors = np.resize(self.used_sectors, self.file_sectors)
+        self.used_sectors[offset:] = True
+
+        return offset
+
+    def _remap(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+
+        self._mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class RegionStorage:
+    # Maps chunk ids to region files inside a world's region folder and keeps a bounded number of them open
+
+    def __init__(self, path: str, chunk_size: int, max_open: int = 64) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.max_open = max_open
+        self.lock = threading.Lock()
+        self.regions = OrderedDict()
+
+        os.makedirs(path, exist_ok=True)
+
+    def get_location(self, chunk_id: tuple) -> tuple:
+        x, y, z = (value // self.chunk_size for value in chunk_id)
+
+        region_id = (x // REGION_SIZE, y // REGION_SIZE, z // REGION_SIZE)
+        index = (x % REGION_SIZE) * REGION_SIZE * REGION_SIZE + (y % REGION_SIZE) * REGION_SIZE + z % REGION_SIZE
+
+        return region_id, index
+
+    def get_region(self, region_id: tuple, create: bool) -> RegionFile:
+        with self.lock:
+            if region_id in self.regions:
+                self.regions.move_to_end(region_id)
+                return self.regions[region_id]
+
+            path = f"{self.path}/{region_id[0]}_{region_id[1]}_{region_id[2]}"
+
+            if not create and not os.path.isfile(path):
+                return None
+
+            region = self.regions[region_id] = RegionFile(path)
+
+            if len(self.regions) > self.max_open:
+                _, oldest = self.regions.popitem(last=False)
+                oldest.close()
+
+            return region
+
+    def read(self, chunk_id: tuple) -> bytes:
+        region_id, index = self.get_location(chunk_id)
+
+        while region := self.get_region(region_id, create=False):
+            try:
+                return region.read(index)
+            except ValueError:
+                continue  # Region was closed by another thread, open it again
+
+        return None
+
+    def write(self, chunk_id: tuple, data: bytes) -> None:
+        region_id, index = self.get_location(chunk_id)
+
+        while True:
+            region = self.get_region(region_id, create=True)
+
+            try:
+                region.write(index, data)
+                return
+            except ValueError:
+                continue
+
+    def close(self) -> None:
+        with self.lock:
+            for region in self.regions.values():
+                region.close()
+
+            self.regions.clear()
+
+    def migrate(self, chunk_path: str) -> int:
+        # One-shot conversion of the old layout with one file per chunk named "x_y_z"
+        count = 0
+
+        for file_name in os.listdir(chunk_path):
+            try:
+                chunk_id = tuple(int(value) for value in file_name.split("_"))
+            except ValueError:
+                continue
+
+            if len(chunk_id) != 3:
+                continue
+
+            with open(f"{chunk_path}/{file_name}", "rb") as file:
+                self.write(chunk_id, file.read())
+
+            os.remove(f"{chunk_path}/{file_name}")
+            count += 1
+
+        if not os.listdir(chunk_path):
+            os.rmdir(chunk_path)
+
+        return count
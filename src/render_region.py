@@ -0,0 +1,98 @@
+REGION_SHAPES = ("cube", "sphere", "cylinder")
+
+DIRECTIONS = ((1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1))
+
+
+class RenderRegion:
+    # Chunks around the player chunk that are kept loaded. Offsets are in chunks, chunk ids in voxels. For every single
+    # chunk step the offsets that enter and leave the region are precomputed, so moving the region only touches a slab.
+
+    def __init__(self, chunk_size: int, render_distance: int, shape: str = "cube") -> None:
+        if shape not in REGION_SHAPES:
+            raise ValueError(f"unknown render region shape '{shape}'")
+
+        self.chunk_size = chunk_size
+        self.render_distance = render_distance
+        self.shape = shape
+
+        distance = range(-render_distance, render_distance + 1)
+        self.offsets = [(x, y, z) for x in distance for y in distance for z in distance if self.contains_offset((x, y, z))]
+
+        self.entering = {}
+        self.leaving = {}
+
+        for direction in DIRECTIONS:
+            self.entering[direction] = [offset for offset in self.offsets if not self.contains_offset(add(offset, direction))]
+            self.leaving[direction] = [offset for offset in self.offsets if not self.contains_offset(sub(offset, direction))]
+
+    def contains_offset(self, offset: tuple) -> bool:
+        x, y, z = offset
+        distance = self.render_distance
+
+        if self.shape == "sphere":
+            return x * x + y * y + z * z <= distance * (distance + 1)
+
+        if self.shape == "cylinder":
+            return x * x + z * z <= distance * (distance + 1) and abs(y) <= distance
+
+        return max(abs(x), abs(y), abs(z)) <= distance
+
+    def contains(self, center: tuple, chunk_id: tuple) -> bool:
+        return self.contains_offset(tuple((chunk_id[i] - center[i]) // self.chunk_size for i in range(3)))
+
+    def get_chunks(self, center: tuple) -> set:
+        return {self.to_chunk_id(center, offset) for offset in self.offsets}
+
+    def to_chunk_id(self, center: tuple, offset: tuple) -> tuple:
+        return (
+            offset[0] * self.chunk_size + center[0],
+            offset[1] * self.chunk_size + center[1],
+            offset[2] * self.chunk_size + center[2],
+        )
+
+    def diff(self, old_center: tuple, new_center: tuple) -> tuple:
+        # Returns the sets of chunk ids entering and leaving the region when it moves from old_center to new_center
+        steps = [(new_center[i] - old_center[i]) // self.chunk_size for i in range(3)]
+
+        # Past this many steps the slabs would cover more than the whole region
+        if sum(abs(step) for step in steps) * len(self.entering[DIRECTIONS[0]]) >= len(self.offsets):
+            old_chunks = self.get_chunks(old_center)
+            new_chunks = self.get_chunks(new_center)
+
+            return new_chunks - old_chunks, old_chunks - new_chunks
+
+        entering = set()
+        leaving = set()
+        center = old_center
+
+        for axis in range(3):
+            direction = tuple((1 if steps[axis] > 0 else -1) if i == axis else 0 for i in range(3))
+
+            for _ in range(abs(steps[axis])):
+                for offset in self.leaving[direction]:
+                    chunk_id = self.to_chunk_id(center, offset)
+
+                    if chunk_id in entering:
+                        entering.discard(chunk_id)
+                    else:
+                        leaving.add(chunk_id)
+
+                center = self.to_chunk_id(center, direction)
+
+                for offset in self.entering[direction]:
+                    chunk_id = self.to_chunk_id(center, offset)
+
+                    if chunk_id in leaving:
+                        leaving.discard(chunk_id)
+                    else:
+                        entering.add(chunk_id)
+
+        return entering, leaving
+
+
+def add(a: tuple, b: tuple) -> tuple:
+    return (a[0] + b[0], a[1] + b[1], a[2] + b[2])
+
+
+def sub(a: tuple, b: tuple) -> tuple:
+    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
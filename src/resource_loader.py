@@ -5,6 +5,9 @@ import numpy as np
 from panda3d.core import PNMImage, SamplerState, Shader, Texture
 from ursina import print_warning
 
+# Texture ids are packed into the upper 11 bits of the vertex data, see copy_quad in mesh_generator.pyx and voxel.vert
+MAX_TEXTURES = 2**11
+
 
 class ResourceLoader:
     def __init__(self) -> None:
@@ -12,9 +15,9 @@ class ResourceLoader:
         self.voxel_display_shader = Shader.load(Shader.SL_GLSL, "shaders/voxel_display.vert", "shaders/voxel_display.frag")
         self.outline_shader = Shader.load(Shader.SL_GLSL, "shaders/outline.vert", "shaders/outline.frag")
 
-        files = os.listdir("assets/voxel_types/")
+        files = sorted(os.listdir("assets/voxel_types/"))
 
-        voxels = []
+        voxels = {}
         textures = []
 
         for file_name in files:
@@ -25,26 +28,38 @@ class ResourceLoader:
                 data = json.load(file)
                 result = self.validate_type(data)
 
+                if not result and data["index"] in voxels:
+                    result = f"index {data['index']} is already used"
+
                 if result:
                     print_warning(f"failed to load voxel type '{file_name}' ({result})")
                     continue
 
-                voxels.append(data)
+                voxels[data["index"]] = data
+
+        for voxel_id in sorted(voxels):
+            new_textures = [name for name in dict.fromkeys(voxels[voxel_id]["textures"]) if name not in textures]
+
+            if len(textures) + len(new_textures) > MAX_TEXTURES:
+                print_warning(f"failed to load voxel type with index {voxel_id} (more than {MAX_TEXTURES} textures)")
+                del voxels[voxel_id]
+                continue
+
+            textures.extend(new_textures)
 
-        voxels.sort(key=lambda value: value["index"])
-        self.type_count = len(voxels)
+        # The tables are indexed with voxel id - 1, ids without a type keep the first texture and no collision or occlusion
+        self.voxel_ids = sorted(voxels)
+        self.type_count = max(voxels, default=0)
 
         self.texture_types = np.zeros(self.type_count * 3, dtype=np.intc)
         self.collision_types = np.zeros(self.type_count, dtype=np.intc)
         self.occlusion_types = np.zeros(self.type_count, dtype=np.intc)
 
-        for i, voxel in enumerate(voxels):
+        for voxel_id in self.voxel_ids:
+            voxel = voxels[voxel_id]
+            i = voxel_id - 1
             texture_names = voxel["textures"]
 
-            for texture_name in texture_names:
-                if texture_name not in textures:
-                    textures.append(texture_name)
-
             if len(texture_names) == 1:
                 self.texture_types[i * 3 + 0] = textures.index(texture_names[0])
                 self.texture_types[i * 3 + 1] = textures.index(texture_names[0])
@@ -82,6 +97,10 @@ class ResourceLoader:
             if not isinstance(voxel_type[key], value):
                 return f"key '{key}' has wrong type"
 
+        # Voxel ids are stored with 16 bits, 0 is air
+        if not 0 < voxel_type["index"] < 2**16:
+            return "index out of range"
+
         if len(texture_names) not in (1, 3):
             return "wrong texture definition"
 
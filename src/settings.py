@@ -4,20 +4,34 @@ import os
 
 class Settings:
     def __init__(self) -> None:
+        self.defaults = {
+            "render_distance": 4,
+            "render_shape": "cube",
+            "prefetch_budget": 32,
+            "lod_distance": 0,
+            "update_threads": 2,
+            "generation_backend": "threads",
+            "delta_saves": True,
+            "greedy_meshing": False,
+            "mesh_cache": False,
+            "occlusion_culling": True,
+            "mouse_sensitivity": 80,
+            "fov": 90,
+        }
+
         if not os.path.isfile("settings.json"):
             self.default_settings()
 
         self.settings = self.load_settings()
 
     def default_settings(self) -> None:
-        settings = {"render_distance": 4, "update_threads": 2, "mouse_sensitivity": 80, "fov": 90}
-
         with open("settings.json", "w+") as file:
-            json.dump(settings, file, indent=4)
+            json.dump(self.defaults, file, indent=4)
 
     def load_settings(self) -> dict:
+        # Keys missing in older settings files fall back to their default value
         with open("settings.json") as file:
-            return json.load(file)
+            return {**self.defaults, **json.load(file)}
 
     def save_settings(self) -> None:
         with open("settings.json", "w+") as file:
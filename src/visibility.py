@@ -0,0 +1,37 @@
+from collections import deque
+
+OPEN = (1 << 36) - 1  # Connectivity of chunks without known voxel data, every face is connected to every other face
+OFFSETS = ((-1, 0, 0), (0, -1, 0), (0, 0, -1), (1, 0, 0), (0, 1, 0), (0, 0, 1))
+
+
+def find_visible_chunks(start: tuple, chunk_size: int, connectivity: dict, contains) -> set:
+    # Breadth first search from the camera chunk through the face connectivity of get_connectivity. A chunk entered through
+    # one face can only be left through faces connected to it and the search never steps against a direction it already
+    # went, so only chunks that could be seen through open voxels are reached. contains limits the search to a region.
+    visible = {start}
+    queue = deque([(start, -1, 0)])
+
+    while queue:
+        chunk_id, entered, directions = queue.popleft()
+        mask = connectivity.get(chunk_id, OPEN)
+
+        for face, offset in enumerate(OFFSETS):
+            if directions & (1 << (face + 3) % 6):
+                continue
+
+            if entered >= 0 and not mask >> (entered * 6 + face) & 1:
+                continue
+
+            neighbor_id = (
+                offset[0] * chunk_size + chunk_id[0],
+                offset[1] * chunk_size + chunk_id[1],
+                offset[2] * chunk_size + chunk_id[2],
+            )
+
+            if neighbor_id in visible or not contains(neighbor_id):
+                continue
+
+            visible.add(neighbor_id)
+            queue.append((neighbor_id, (face + 3) % 6, directions | 1 << face))
+
+    return visible
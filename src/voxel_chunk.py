@@ -1,8 +1,12 @@
+import threading
+
+import numpy as np
 from panda3d.core import (
     BoundingSphere,
     Geom,
     GeomNode,
     GeomTriangles,
+    GeomVertexArrayData,
     GeomVertexArrayFormat,
     GeomVertexData,
     GeomVertexFormat,
@@ -20,35 +24,124 @@ class VoxelChunk(NodePath):
     vertex_format.add_array(v_array)
     vertex_format = GeomVertexFormat.register_format(vertex_format)
 
+    index_format = GeomVertexArrayFormat.register_format(GeomVertexArrayFormat("index", 1, Geom.NT_uint32, Geom.C_index))
+
+    # Index buffer shared by all chunks, every face has 4 vertices that form the triangles 0 1 2 and 2 3 0
+    index_data = None
+    index_lock = threading.Lock()
+
+    @classmethod
+    def get_index_data(cls, face_count: int) -> GeomVertexArrayData:
+        with cls.index_lock:
+            if cls.index_data is None or cls.index_data.get_num_rows() < face_count * 6:
+                capacity = 4096
+
+                while capacity < face_count:
+                    capacity *= 2
+
+                indices = np.arange(capacity, dtype=np.uint32)[:, None] * 4 + np.array([0, 1, 2, 2, 3, 0], dtype=np.uint32)
+
+                # Primitives keep referencing the old buffer until they are updated, its contents stay valid
+                index_data = GeomVertexArrayData(cls.index_format, Geom.UH_static)
+                index_data.unclean_set_num_rows(capacity * 6)
+                memoryview(index_data).cast("B").cast("I")[:] = indices.ravel()
+                cls.index_data = index_data
+
+            return cls.index_data
+
     def __init__(self, chunk_size: int, shader, **kwargs) -> None:
         super().__init__("voxel_chunk", **kwargs)
 
+        self.chunk_size = chunk_size
         self.set_shader(shader)
-        self.set_transparency(TransparencyAttrib.M_dual)
+        self.final = True
 
-        self.geom_node = GeomNode("voxel_chunk")
+        self.geom_node = self.create_geom_node("voxel_chunk")
         self.attach_new_node(self.geom_node)
 
-        v_data = GeomVertexData("voxel_chunk", self.vertex_format, Geom.UH_static)
+        # Only chunks with translucent voxels get a second geom that is blended
+        self.translucent_node = None
+
+        # First face of every section in the opaque and the translucent geom, None if the faces are not sorted by section
+        self.offsets = None
+
+    def create_geom_node(self, name: str) -> GeomNode:
+        geom_node = GeomNode(name)
+
+        v_data = GeomVertexData(name, self.vertex_format, Geom.UH_static)
         prim = GeomTriangles(Geom.UH_static)
 
         geom = Geom(v_data)
         geom.add_primitive(prim)
-        geom.set_bounds(BoundingSphere(Vec3(chunk_size / 2), chunk_size))
-        self.final = True
+        geom.set_bounds(BoundingSphere(Vec3(self.chunk_size / 2), self.chunk_size))
+
+        geom_node.add_geom(geom)
+
+        return geom_node
 
-        self.geom_node.add_geom(geom)
+    def update(self, vertex_data: bytearray, translucent_data: bytearray, offsets: np.ndarray = None) -> None:
+        self.offsets = offsets
+        self.update_geom(self.geom_node, vertex_data)
+        self.update_translucent(translucent_data)
 
-    def update(self, vertex_data: bytearray) -> None:
-        geom = self.geom_node.modify_geom(0)
+    def update_sections(self, sections: np.ndarray, vertex_data: np.ndarray, translucent_data: np.ndarray, offsets: np.ndarray) -> None:
+        # Replaces the faces of the given sections with the output of generate_sections and keeps all other faces. Faces
+        # are overwritten in place if their count did not change, otherwise the vertex data is put together again.
+        for stream, data in enumerate((vertex_data, translucent_data)):
+            geom_node = self.geom_node if stream == 0 else self.translucent_node and self.translucent_node.node()
+            old_offsets = self.offsets[stream]
+            sizes = np.diff(old_offsets)
+            new_sizes = np.diff(offsets[stream])
+
+            if np.array_equal(sizes[sections], new_sizes):
+                if new_sizes.any():
+                    memview = memoryview(geom_node.modify_geom(0).modify_vertex_data().modify_array(0)).cast("B").cast("I")
+
+                    for i, section in enumerate(sections):
+                        memview[old_offsets[section] * 4 : old_offsets[section + 1] * 4] = data[offsets[stream, i] * 4 : offsets[stream, i + 1] * 4]
+
+                continue
+
+            current = np.frombuffer(memoryview(geom_node.get_geom(0).get_vertex_data().get_array(0)), dtype=np.uintc) if geom_node else data[:0]
+            replaced = dict(zip(sections.tolist(), range(len(sections)), strict=True))
+            pieces = []
+
+            for section in range(len(sizes)):
+                if section in replaced:
+                    i = replaced[section]
+                    pieces.append(data[offsets[stream, i] * 4 : offsets[stream, i + 1] * 4])
+                else:
+                    pieces.append(current[old_offsets[section] * 4 : old_offsets[section + 1] * 4])
+
+            sizes[sections] = new_sizes
+            self.offsets[stream, 1:] = np.cumsum(sizes)
+
+            if stream == 0:
+                self.update_geom(self.geom_node, np.concatenate(pieces))
+            else:
+                self.update_translucent(np.concatenate(pieces))
+
+    def update_translucent(self, translucent_data: bytearray) -> None:
+        if len(translucent_data):
+            if self.translucent_node is None:
+                self.translucent_node = self.attach_new_node(self.create_geom_node("voxel_chunk_translucent"))
+                self.translucent_node.set_transparency(TransparencyAttrib.M_dual)
+
+            self.update_geom(self.translucent_node.node(), translucent_data)
+
+        elif self.translucent_node is not None:
+            self.translucent_node.remove_node()
+            self.translucent_node = None
+
+    def update_geom(self, geom_node: GeomNode, vertex_data: bytearray) -> None:
+        geom = geom_node.modify_geom(0)
 
         v_data = geom.modify_vertex_data()
         v_data.unclean_set_num_rows(len(vertex_data))
 
-        prim = geom.modify_primitive(0)
-        prim.clear_vertices()
-
         memview = memoryview(v_data.modify_array(0)).cast("B").cast("I")
         memview[:] = vertex_data
 
-        prim.add_next_vertices(len(vertex_data))
+        face_count = len(vertex_data) // 4
+        prim = geom.modify_primitive(0)
+        prim.set_vertices(self.get_index_data(face_count), face_count * 6)
@@ -0,0 +1,36 @@
+cdef struct ChunkView:
+    const unsigned long long *words
+    const unsigned short *palette  # NULL if the chunk is not loaded
+    int bits
+    int word_shift
+    int index_mask
+    unsigned long long value_mask
+
+
+cdef inline unsigned short view_get(const ChunkView *view, int index) noexcept nogil:
+    if view.bits == 0:
+        return view.palette[0]
+
+    cdef unsigned long long word = view.words[index >> view.word_shift]
+    return view.palette[(word >> ((index & view.index_mask) * view.bits)) & view.value_mask]
+
+
+cdef class PaletteChunk:
+    cdef readonly int size
+    cdef readonly int bits
+    cdef readonly int palette_size
+    cdef readonly bint frozen
+    cdef readonly object palette_array
+    cdef readonly object words_array
+    cdef unsigned short *palette
+    cdef unsigned long long *words
+    cdef int word_shift
+    cdef int index_mask
+    cdef unsigned long long value_mask
+
+    cdef void assign(self, int bits, object palette_array, object words_array)
+    cdef ChunkView get_view(self, list refs)
+    cdef void unpack_into(self, unsigned short *out) noexcept nogil
+    cdef void repack(self, int bits)
+    cpdef unsigned short get(self, int index)
+    cpdef void set(self, int index, unsigned short voxel_id)
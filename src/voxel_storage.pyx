@@ -0,0 +1,522 @@
+# cython: boundscheck=False, wraparound=False, initializedcheck=False, cdivision=True
+cimport numpy as np
+from libc.math cimport INFINITY, ceil, fabs, floor, fmax, fmin, sqrt
+from libc.stdlib cimport free, realloc
+import numpy as np
+
+
+np.import_array()
+
+
+cdef int next_bits(int count):
+    # Smallest supported number of bits per voxel (0, 1, 2, 4, 8 or 16) that can address count palette entries
+    cdef int bits = 0
+
+    while (1 << bits) < count:
+        bits = 1 if bits == 0 else bits * 2
+
+    return bits
+
+
+cdef int palette_capacity(int bits):
+    # Chunks with 16 bits per voxel start with a smaller palette that grows on demand
+    return min(1 << bits, 512)
+
+
+cdef int log2(int value) noexcept nogil:
+    cdef int result = 0
+
+    while value > 1:
+        value >>= 1
+        result += 1
+
+    return result
+
+
+cdef class PaletteChunk:
+    # Voxel ids of a chunk stored as indices into a palette. The indices are packed into 64 bit words with 0, 1, 2, 4, 8
+    # or 16 bits per voxel, a chunk with 0 bits is filled with a single voxel id. Palette entries are never removed.
+    # Frozen chunks can not be changed anymore, threads can read them without locks for as long as they hold a reference.
+    # Chunks shared between threads are frozen and edited by replacing them with a changed copy.
+
+    def __init__(self, int size, palette, words=None):
+        cdef np.ndarray palette_array
+        cdef int bits = next_bits(len(palette))
+
+        palette_array = np.zeros(max(len(palette), palette_capacity(bits)), dtype=np.uint16)
+        palette_array[: len(palette)] = palette
+
+        if words is None:
+            words = np.zeros(-(-size * bits // 64), dtype=np.uint64)
+        else:
+            words = np.require(words, dtype=np.uint64, requirements=["C", "W"])
+
+        self.size = size
+        self.palette_size = len(palette)
+        self.assign(bits, palette_array, words)
+
+    cdef void assign(self, int bits, object palette_array, object words_array):
+        # Arrays are swapped as a whole, views taken before keep the old arrays alive through their refs
+        self.palette_array = palette_array
+        self.words_array = words_array
+        self.palette = <unsigned short*>np.PyArray_DATA(<np.ndarray>palette_array)
+        self.words = <unsigned long long*>np.PyArray_DATA(<np.ndarray>words_array)
+        self.bits = bits
+        self.word_shift = log2(64 // bits) if bits else 0
+        self.index_mask = 64 // bits - 1 if bits else 0
+        self.value_mask = (1ULL << bits) - 1
+
+    @staticmethod
+    def from_array(data):
+        cdef np.ndarray values = np.ascontiguousarray(data)
+
+        if values.dtype == np.uint8:
+            return from_bytes(values)
+
+        palette, indices = np.unique(values, return_inverse=True)
+        chunk = PaletteChunk(len(values), palette)
+        chunk.pack(indices.astype(np.uint16))
+
+        return chunk
+
+    @staticmethod
+    def from_packed(int size, int palette_size, palette, words):
+        chunk = PaletteChunk(size, palette[:palette_size], words)
+
+        if len(chunk.words_array) != -(-size * chunk.bits // 64):
+            raise ValueError("packed data does not match palette size")
+
+        return chunk
+
+    def pack(self, const unsigned short[::1] indices):
+        cdef int i
+
+        if self.frozen:
+            raise ValueError("frozen chunks can not be changed, edit a copy instead")
+
+        if self.bits == 0:
+            return
+
+        with nogil:
+            for i in range(self.size):
+                self.words[i >> self.word_shift] |= <unsigned long long>indices[i] << ((i & self.index_mask) * self.bits)
+
+    cdef ChunkView get_view(self, list refs):
+        cdef ChunkView view
+
+        view.words = self.words
+        view.palette = self.palette
+        view.bits = self.bits
+        view.word_shift = self.word_shift
+        view.index_mask = self.index_mask
+        view.value_mask = self.value_mask
+
+        refs.append(self.palette_array)
+        refs.append(self.words_array)
+
+        return view
+
+    cdef void unpack_into(self, unsigned short *out) noexcept nogil:
+        cdef int i
+
+        if self.bits == 0:
+            for i in range(self.size):
+                out[i] = self.palette[0]
+
+            return
+
+        for i in range(self.size):
+            out[i] = self.palette[(self.words[i >> self.word_shift] >> ((i & self.index_mask) * self.bits)) & self.value_mask]
+
+    cdef void repack(self, int bits):
+        cdef int i, entry
+        cdef int word_shift = log2(64 // bits)
+        cdef int index_mask = 64 // bits - 1
+        cdef np.ndarray palette_array = np.zeros(max(self.palette_size, palette_capacity(bits)), dtype=np.uint16)
+        cdef np.ndarray words_array = np.zeros(-(-self.size * bits // 64), dtype=np.uint64)
+        cdef unsigned long long *words = <unsigned long long*>np.PyArray_DATA(words_array)
+
+        palette_array[: self.palette_size] = self.palette_array[: self.palette_size]
+
+        if self.bits:
+            with nogil:
+                for i in range(self.size):
+                    entry = (self.words[i >> self.word_shift] >> ((i & self.index_mask) * self.bits)) & self.value_mask
+                    words[i >> word_shift] |= <unsigned long long>entry << ((i & index_mask) * bits)
+
+        self.assign(bits, palette_array, words_array)
+
+    cpdef unsigned short get(self, int index):
+        if self.bits == 0:
+            return self.palette[0]
+
+        return self.palette[(self.words[index >> self.word_shift] >> ((index & self.index_mask) * self.bits)) & self.value_mask]
+
+    cpdef void set(self, int index, unsigned short voxel_id):
+        cdef int i, shift
+        cdef int entry = -1
+        cdef np.ndarray palette_array
+
+        if self.frozen:
+            raise ValueError("frozen chunks can not be changed, edit a copy instead")
+
+        for i in range(self.palette_size):
+            if self.palette[i] == voxel_id:
+                entry = i
+                break
+
+        if entry < 0:
+            if self.palette_size == 1 << self.bits:
+                self.repack(next_bits(self.palette_size + 1))
+
+            elif self.palette_size == len(self.palette_array):
+                palette_array = np.zeros(min(self.palette_size * 2, 1 << self.bits), dtype=np.uint16)
+                palette_array[: self.palette_size] = self.palette_array
+                self.assign(self.bits, palette_array, self.words_array)
+
+            entry = self.palette_size
+            self.palette[entry] = voxel_id
+            self.palette_size += 1
+
+        if self.bits == 0:
+            return
+
+        shift = (index & self.index_mask) * self.bits
+        i = index >> self.word_shift
+
+        self.words[i] = (self.words[i] & ~(self.value_mask << shift)) | (<unsigned long long>entry << shift)
+
+    def to_array(self):
+        cdef np.ndarray[unsigned short, ndim=1] data = np.empty(self.size, dtype=np.uint16)
+
+        with nogil:
+            self.unpack_into(&data[0])
+
+        return data
+
+    def freeze(self):
+        self.frozen = True
+
+    def copy(self):
+        # Copies are never frozen
+        return PaletteChunk.from_packed(self.size, self.palette_size, self.palette_array.copy(), self.words_array.copy())
+
+    @property
+    def uniform_id(self):
+        # Voxel id of a chunk filled with a single id, -1 otherwise
+        return self.palette[0] if self.bits == 0 else -1
+
+    @property
+    def nbytes(self):
+        return self.palette_array.nbytes + self.words_array.nbytes
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, int index):
+        return self.get(index)
+
+    def __setitem__(self, int index, unsigned short voxel_id):
+        self.set(index, voxel_id)
+
+
+cdef PaletteChunk from_bytes(const unsigned char[::1] values):
+    # Fast path for generated chunks, voxel ids below 256 are mapped with a lookup table
+    cdef int i
+    cdef int size = values.shape[0]
+    cdef int palette_size = 0
+    cdef int[256] mapping
+    cdef unsigned short[256] palette
+    cdef PaletteChunk chunk
+
+    for i in range(256):
+        mapping[i] = -1
+
+    with nogil:
+        for i in range(size):
+            if mapping[values[i]] < 0:
+                mapping[values[i]] = palette_size
+                palette[palette_size] = values[i]
+                palette_size += 1
+
+    chunk = PaletteChunk(size, [palette[i] for i in range(palette_size)])
+
+    if chunk.bits == 0:
+        return chunk
+
+    with nogil:
+        for i in range(size):
+            chunk.words[i >> chunk.word_shift] |= <unsigned long long>mapping[values[i]] << ((i & chunk.index_mask) * chunk.bits)
+
+    return chunk
+
+
+def get_voxel_ids(int chunk_size, dict chunks, positions):
+    # Voxel ids at an (n, 3) array of world positions rounded to the nearest voxel, chunks maps chunk ids to chunks.
+    # Positions in chunks that are not in chunks get -1. Consecutive positions in the same chunk share one lookup.
+    cdef const double[:, ::1] points = np.ascontiguousarray(positions, dtype=np.float64).reshape(-1, 3)
+    cdef np.ndarray[int, ndim=1] voxel_ids = np.empty(points.shape[0], dtype=np.intc)
+    cdef int i, j, index
+    cdef int[3] position, chunk_id
+    cdef int[3] last_id = [0, 0, 0]
+    cdef bint found = False
+    cdef PaletteChunk chunk = None
+
+    for i in range(points.shape[0]):
+        for j in range(3):
+            position[j] = <int>floor(points[i, j] + 0.5)
+            chunk_id[j] = <int>floor(<double>position[j] / chunk_size) * chunk_size
+
+        if not found or chunk_id[0] != last_id[0] or chunk_id[1] != last_id[1] or chunk_id[2] != last_id[2]:
+            chunk = chunks.get((chunk_id[0], chunk_id[1], chunk_id[2]))
+            last_id = chunk_id
+            found = True
+
+        if chunk is None:
+            voxel_ids[i] = -1
+            continue
+
+        index = (position[0] - chunk_id[0]) * chunk_size * chunk_size + (position[1] - chunk_id[1]) * chunk_size + position[2] - chunk_id[2]
+        voxel_ids[i] = chunk.get(index)
+
+    return voxel_ids
+
+
+def raycast(int chunk_size, dict chunks, origins, directions, max_distance):
+    # Walks the voxels along rays from origins in directions, both (n, 3) arrays, and stops at the first voxel that is not
+    # air within max_distance, a number or one per ray. The voxel a ray starts in is skipped and chunks that are not in
+    # chunks are walked through. Returns the voxel positions, the normals of the hit faces and the voxel ids, 0 for no hit.
+    cdef const double[:, ::1] starts = np.ascontiguousarray(origins, dtype=np.float64).reshape(-1, 3)
+    cdef const double[:, ::1] rays = np.ascontiguousarray(directions, dtype=np.float64).reshape(-1, 3)
+    cdef Py_ssize_t count = starts.shape[0]
+
+    if rays.shape[0] != count:
+        raise ValueError("origins and directions must have the same number of rays")
+
+    cdef const double[::1] distances = np.ascontiguousarray(np.broadcast_to(max_distance, (count,)), dtype=np.float64)
+    cdef np.ndarray[int, ndim=2] positions = np.zeros((count, 3), dtype=np.intc)
+    cdef np.ndarray[int, ndim=2] normals = np.zeros((count, 3), dtype=np.intc)
+    cdef np.ndarray[int, ndim=1] voxel_ids = np.zeros(count, dtype=np.intc)
+    cdef int i, j, axis, index, voxel_id
+    cdef int[3] position, step, chunk_id
+    cdef int[3] last_id = [0, 0, 0]
+    cdef double[3] delta, boundary
+    cdef double length
+    cdef bint cached = False
+    cdef PaletteChunk chunk = None
+
+    for i in range(count):
+        length = sqrt(rays[i, 0] * rays[i, 0] + rays[i, 1] * rays[i, 1] + rays[i, 2] * rays[i, 2])
+
+        if length == 0:
+            continue
+
+        # Distance along the ray between two voxel boundaries of an axis and to the next one
+        for j in range(3):
+            position[j] = <int>floor(starts[i, j] + 0.5)
+            step[j] = 1 if rays[i, j] >= 0 else -1
+
+            if rays[i, j] == 0:
+                delta[j] = INFINITY
+                boundary[j] = INFINITY
+            else:
+                delta[j] = length / fabs(rays[i, j])
+                boundary[j] = delta[j] * (0.5 - (starts[i, j] - position[j]) * step[j])
+
+        while True:
+            if boundary[0] <= boundary[1] and boundary[0] <= boundary[2]:
+                axis = 0
+            elif boundary[1] <= boundary[2]:
+                axis = 1
+            else:
+                axis = 2
+
+            if boundary[axis] > distances[i]:
+                break
+
+            boundary[axis] += delta[axis]
+            position[axis] += step[axis]
+
+            for j in range(3):
+                chunk_id[j] = <int>floor(<double>position[j] / chunk_size) * chunk_size
+
+            if not cached or chunk_id[0] != last_id[0] or chunk_id[1] != last_id[1] or chunk_id[2] != last_id[2]:
+                chunk = chunks.get((chunk_id[0], chunk_id[1], chunk_id[2]))
+                last_id = chunk_id
+                cached = True
+
+            if chunk is None:
+                continue
+
+            index = (position[0] - chunk_id[0]) * chunk_size * chunk_size + (position[1] - chunk_id[1]) * chunk_size + position[2] - chunk_id[2]
+            voxel_id = chunk.get(index)
+
+            if voxel_id:
+                for j in range(3):
+                    positions[i, j] = position[j]
+
+                normals[i, axis] = -step[axis]
+                voxel_ids[i] = voxel_id
+                break
+
+    return positions, normals, voxel_ids
+
+
+cdef double get_time(double x, double y) noexcept nogil:
+    # Part of a move y needed to cover the distance x, infinite if there is no move
+    if y:
+        return x / y
+
+    return -INFINITY if x > 0 else INFINITY
+
+
+def move_boxes(int chunk_size, dict chunks, const int[::1] collision_types, positions, velocities, box_min, box_max, double dt):
+    # Moves axis aligned boxes spanning box_min to box_max around positions by velocities * dt through the colliding voxels
+    # in chunks. The move is cut at the first voxel hit up to three times, then the box is pushed out of voxels it overlaps
+    # by at most 0.02. Velocities, box_min and box_max can be given once for all boxes. Returns the moves, the velocities
+    # with blocked axes set to 0, whether the boxes landed on a voxel and the normals of the voxel faces they touched.
+    cdef const double[:, ::1] starts = np.ascontiguousarray(positions, dtype=np.float64).reshape(-1, 3)
+    cdef Py_ssize_t count = starts.shape[0]
+    cdef const double[:, ::1] lows = np.ascontiguousarray(np.broadcast_to(box_min, (count, 3)), dtype=np.float64)
+    cdef const double[:, ::1] highs = np.ascontiguousarray(np.broadcast_to(box_max, (count, 3)), dtype=np.float64)
+    cdef np.ndarray[double, ndim=2] moves = np.empty((count, 3), dtype=np.float64)
+    cdef np.ndarray[double, ndim=2] speeds = np.array(np.broadcast_to(velocities, (count, 3)), dtype=np.float64)
+    cdef np.ndarray[np.uint8_t, ndim=1] grounded = np.zeros(count, dtype=np.uint8)
+    cdef np.ndarray[int, ndim=2] normals = np.zeros((count, 3), dtype=np.intc)
+    cdef int i, j, k, x, y, z, index, voxel_id, hit, _, normal
+    cdef int voxel_count, capacity = 0
+    cdef int[3] first, last, chunk_id
+    cdef int[3] last_id = [0, 0, 0]
+    cdef double[3] move, low, high, entry, hit_entry, exit, above, below, hit_above, hit_below
+    cdef double entry_time, exit_time, distance, best
+    cdef int *voxels = NULL
+    cdef int *resized
+    cdef bint cached = False
+    cdef PaletteChunk chunk = None
+
+    try:
+        for i in range(count):
+            for j in range(3):
+                move[j] = speeds[i, j] * dt
+                low[j] = starts[i, j] + lows[i, j]
+                high[j] = starts[i, j] + highs[i, j]
+
+                # Voxels touching the box anywhere along the move
+                first[j] = <int>ceil(fmin(low[j], low[j] + move[j]) - 0.5)
+                last[j] = <int>floor(fmax(high[j], high[j] + move[j]) + 0.5)
+
+            voxel_count = 0
+
+            for x in range(first[0], last[0] + 1):
+                for y in range(first[1], last[1] + 1):
+                    for z in range(first[2], last[2] + 1):
+                        chunk_id[0] = <int>floor(<double>x / chunk_size) * chunk_size
+                        chunk_id[1] = <int>floor(<double>y / chunk_size) * chunk_size
+                        chunk_id[2] = <int>floor(<double>z / chunk_size) * chunk_size
+
+                        if not cached or chunk_id[0] != last_id[0] or chunk_id[1] != last_id[1] or chunk_id[2] != last_id[2]:
+                            chunk = chunks.get((chunk_id[0], chunk_id[1], chunk_id[2]))
+                            last_id = chunk_id
+                            cached = True
+
+                        if chunk is None:
+                            continue
+
+                        index = (x - chunk_id[0]) * chunk_size * chunk_size + (y - chunk_id[1]) * chunk_size + z - chunk_id[2]
+                        voxel_id = chunk.get(index)
+
+                        if not voxel_id or not collision_types[voxel_id - 1]:
+                            continue
+
+                        if voxel_count == capacity:
+                            capacity = capacity * 2 + 64
+                            resized = <int *>realloc(voxels, capacity * 3 * sizeof(int))
+
+                            if resized == NULL:
+                                raise MemoryError()
+
+                            voxels = resized
+
+                        voxels[voxel_count * 3] = x
+                        voxels[voxel_count * 3 + 1] = y
+                        voxels[voxel_count * 3 + 2] = z
+                        voxel_count += 1
+
+            # Cut the move at the earliest entry into a voxel
+            for _ in range(3):
+                best = INFINITY
+                hit = -1
+
+                for k in range(voxel_count):
+                    for j in range(3):
+                        if move[j] > 0:
+                            entry[j] = get_time(voxels[k * 3 + j] - 0.5 - high[j], move[j])
+                            exit[j] = get_time(voxels[k * 3 + j] + 0.5 - low[j], move[j])
+                        else:
+                            entry[j] = get_time(voxels[k * 3 + j] + 0.5 - low[j], move[j])
+                            exit[j] = get_time(voxels[k * 3 + j] - 0.5 - high[j], move[j])
+
+                    entry_time = fmax(entry[0], fmax(entry[1], entry[2]))
+                    exit_time = fmin(exit[0], fmin(exit[1], exit[2]))
+
+                    if entry_time > exit_time or entry_time > 1 or entry_time < 0:
+                        continue
+
+                    if entry_time < best:
+                        best = entry_time
+                        hit = k
+                        hit_entry = entry
+
+                if hit < 0:
+                    break
+
+                for j in range(3):
+                    if hit_entry[j] != best:
+                        continue
+
+                    normal = -1 if move[j] > 0 else 1
+                    normals[i, j] = normal
+                    speeds[i, j] = 0
+                    move[j] *= best
+
+                    if j == 1 and normal == 1:
+                        grounded[i] = True
+
+            # Push the box out of the voxel it overlaps least
+            for _ in range(3):
+                best = INFINITY
+                hit = -1
+
+                for k in range(voxel_count):
+                    for j in range(3):
+                        above[j] = low[j] + move[j] - voxels[k * 3 + j] - 0.5
+                        below[j] = voxels[k * 3 + j] - 0.5 - high[j] - move[j]
+
+                    distance = fmax(fmax(above[0], below[0]), fmax(fmax(above[1], below[1]), fmax(above[2], below[2])))
+
+                    if distance >= 0:
+                        continue
+
+                    if -distance < best:
+                        best = -distance
+                        hit = k
+                        hit_above = above
+                        hit_below = below
+
+                if hit < 0 or best > 0.02:
+                    break
+
+                for j in range(3):
+                    normal = (hit_above[j] == -best) - (hit_below[j] == -best)
+
+                    if normal:
+                        normals[i, j] = normal
+                        speeds[i, j] = 0
+                        move[j] = best * normal
+
+            for j in range(3):
+                moves[i, j] = move[j]
+    finally:
+        free(voxels)
+
+    return moves, speeds, grounded.view(np.bool_), normals
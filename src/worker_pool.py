@@ -0,0 +1,67 @@
+import threading
+
+from ursina import print_warning
+
+
+class WorkerPool:
+    # Threads that sleep until a job is queued. Every job type has a ChunkQueue created with the condition of the pool, so
+    # putting a chunk id wakes a worker. Job types listed first are served first, every worker runs one job at a time.
+
+    def __init__(self, condition: threading.Condition, jobs: list) -> None:
+        self.condition = condition
+        self.jobs = jobs  # (job type, queue, handler) ordered by priority, the handler is called with the chunk id
+        self.size = 0
+        self.threads = {}  # Worker index -> thread, workers with an index of at least size exit after their current job
+        self.completed = dict.fromkeys((job_type for job_type, _, _ in jobs), 0)
+
+    def resize(self, size: int) -> None:
+        with self.condition:
+            self.size = size
+
+            for index in range(size):
+                if index not in self.threads:
+                    self.threads[index] = threading.Thread(target=self.run, args=(index,), name=f"chunk_worker_{index}", daemon=True)
+                    self.threads[index].start()
+
+            self.condition.notify_all()
+
+    def close(self) -> None:
+        # Waits until every worker finished its current job and exited
+        self.resize(0)
+
+        with self.condition:
+            threads = list(self.threads.values())
+
+        for thread in threads:
+            thread.join()
+
+    def get_job(self) -> tuple:
+        # Has to be called with the condition held
+        for job_type, queue, handler in self.jobs:
+            if (chunk_id := queue.get()) is not None:
+                return job_type, queue, handler, chunk_id
+
+        return None
+
+    def run(self, index: int) -> None:
+        while True:
+            with self.condition:
+                job = None
+
+                while index < self.size and (job := self.get_job()) is None:
+                    self.condition.wait()
+
+                if job is None:
+                    del self.threads[index]
+                    return
+
+            job_type, queue, handler, chunk_id = job
+
+            try:
+                handler(chunk_id)
+            except Exception as exception:
+                print_warning(f"Failed to {job_type} chunk {chunk_id} \n {exception}")
+
+            with self.condition:
+                queue.task_done(chunk_id)
+                self.completed[job_type] += 1